@@ -2,12 +2,13 @@ from fastapi import APIRouter, HTTPException, status, Depends,Body
 from typing import List
 from fastapi.security import OAuth2PasswordBearer
 from schema import UserSchema,LoginAdminModel, AdminSchema,LoginUserModel
-from database import SessionLocal
+from database import get_db, get_read_db
 from models import User,Admin
 from werkzeug.security import generate_password_hash, check_password_hash
 from jose import jwt, JWTError  
 from datetime import datetime, timedelta
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from query_budget import query_budget
 
 auth_router = APIRouter(
     prefix="/auth",
@@ -16,14 +17,6 @@ auth_router = APIRouter(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 def create_access_token(data: dict):
 
     to_encode = data.copy()
@@ -146,7 +139,8 @@ async def login(form_data: LoginUserModel = Body(...), db=Depends(get_db)):
     }
 
 @auth_router.get("/users", response_model=List[UserSchema])
-async def get_all_users(db=Depends(get_db)):
+@query_budget(1)
+async def get_all_users(db=Depends(get_read_db)):
     users = db.query(User).all()
     return users
 
@@ -0,0 +1,56 @@
+"""
+Memory per connection and mass-disconnect time for the WebSocketManager
+registry at 100k simulated connections.
+
+    python benchmarks/bench_connection_registry.py
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websocket_manager import WebSocketManager
+
+CONNECTIONS = 100_000
+
+
+class StubWebSocket:
+    __slots__ = ()
+
+    async def accept(self):
+        pass
+
+
+async def run():
+    manager = WebSocketManager()
+    # Keep the ping task out of the measurement
+    manager.start = lambda: None
+    sockets = [StubWebSocket() for _ in range(CONNECTIONS)]
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    for i, ws in enumerate(sockets):
+        # Half identified, half anonymous
+        await manager.connect(ws, f"client-{i}" if i % 2 else None)
+    connect_time = time.perf_counter() - started
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    used = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(f"{CONNECTIONS} connections: {used / 1e6:.1f} MB, {used / CONNECTIONS:.0f} B/connection")
+    print(f"connect:         {connect_time * 1000:.0f} ms")
+
+    started = time.perf_counter()
+    for ws in sockets:
+        manager.disconnect(ws)
+    elapsed = time.perf_counter() - started
+    print(f"mass disconnect: {elapsed * 1000:.0f} ms ({elapsed / CONNECTIONS * 1e6:.2f} us/connection)")
+    assert not manager.sockets and not manager.connections
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,85 @@
+"""
+Message history latency on SQLite: monthly partitions against the same rows
+in one unpartitioned table, for the newest page and a one-month window.
+
+    python benchmarks/bench_message_history.py
+"""
+from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+
+from sqlalchemy import insert
+
+import models  # noqa: F401  (registers every table on Base.metadata)
+from database import Base, SessionLocal, engine
+from message_store import _partition_table, ensure_partition, message_history
+from models import Message
+
+MONTHS = 12
+PER_MONTH = 20_000
+RUNS = 50
+
+
+def seed(db):
+    start = datetime(2025, 1, 1)
+    for month in range(MONTHS):
+        first = start + timedelta(days=31 * month)
+        name = ensure_partition(db, first)
+        rows = [
+            {
+                "content": f"message {i}",
+                "sender_id": str(i % 500),
+                "is_broadcast": i % 10 == 0,
+                "timestamp": first.replace(day=1) + timedelta(seconds=i * 100),
+            }
+            for i in range(PER_MONTH)
+        ]
+        db.execute(insert(_partition_table(name)), rows)
+        # The unpartitioned baseline holds the same rows
+        db.execute(
+            insert(Message.__table__),
+            [dict(row, id=month * PER_MONTH + i + 1) for i, row in enumerate(rows)]
+        )
+    db.commit()
+
+
+def timed(label, query):
+    query()
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        query()
+    print(f"{label:<38} {(time.perf_counter() - started) / RUNS * 1000:7.2f} ms")
+
+
+def unpartitioned(db, client_id, since=None, until=None, limit=100):
+    query = db.query(Message).filter((Message.sender_id == client_id) | (Message.is_broadcast == True))
+    if since:
+        query = query.filter(Message.timestamp >= since)
+    if until:
+        query = query.filter(Message.timestamp < until)
+    return query.order_by(Message.timestamp.desc()).limit(limit).all()
+
+
+def run():
+    engine.echo = False
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    seed(db)
+    print(f"{MONTHS * PER_MONTH} messages over {MONTHS} months")
+
+    window = {"since": datetime(2025, 6, 1), "until": datetime(2025, 7, 1)}
+    timed("newest page, partitioned", lambda: message_history(db, client_id="7"))
+    timed("newest page, one table", lambda: unpartitioned(db, "7"))
+    timed("one-month window, partitioned", lambda: message_history(db, client_id="7", **window))
+    timed("one-month window, one table", lambda: unpartitioned(db, "7", **window))
+    db.close()
+
+
+if __name__ == "__main__":
+    run()
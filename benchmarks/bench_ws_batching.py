@@ -0,0 +1,77 @@
+"""
+Frames/sec and bytes/sec for a burst of small events, with and without
+micro-batching. Bytes are reported raw and deflated per frame, as
+permessage-deflate without context takeover would send them.
+
+    python benchmarks/bench_ws_batching.py
+"""
+import asyncio
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websocket_manager import WebSocketManager
+
+EVENTS = 20_000
+CLIENTS = 10
+
+
+class CountingWebSocket:
+    def __init__(self):
+        self.frames = 0
+        self.raw_bytes = 0
+        self.deflated_bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        payload = data.encode()
+        compressor = zlib.compressobj(wbits=-15)
+        self.frames += 1
+        self.raw_bytes += len(payload)
+        self.deflated_bytes += len(compressor.compress(payload) + compressor.flush())
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run(batch_ms):
+    manager = WebSocketManager()
+    sockets = [CountingWebSocket() for _ in range(CLIENTS)]
+    for i, ws in enumerate(sockets):
+        await manager.connect(ws, f"client-{i}", batch_ms)
+
+    started = time.perf_counter()
+    for n in range(EVENTS):
+        await manager.broadcast({
+            "type": "new_order",
+            "order_id": n,
+            "product": "Custom T-shirt",
+            "status": "Pending"
+        })
+        if n % 100 == 0:
+            # Let flush tasks run as they would between requests
+            await asyncio.sleep(0)
+    # Wait out the last window
+    await asyncio.sleep((batch_ms or 0) / 1000 + 0.05)
+    elapsed = time.perf_counter() - started
+
+    frames = sum(ws.frames for ws in sockets)
+    raw = sum(ws.raw_bytes for ws in sockets)
+    deflated = sum(ws.deflated_bytes for ws in sockets)
+    events = EVENTS * CLIENTS
+    label = f"batch_ms={batch_ms}" if batch_ms else "unbatched"
+    print(
+        f"{label:>12}: {frames:>8} frames ({frames / elapsed:>10.0f}/s), "
+        f"{raw / events:6.1f} raw B/event, {deflated / events:6.1f} deflated B/event, "
+        f"{deflated / elapsed / 1e6:6.2f} MB/s deflated, {events / elapsed:>9.0f} events/s"
+    )
+
+
+if __name__ == "__main__":
+    for batch_ms in (None, 5, 20):
+        asyncio.run(run(batch_ms))
@@ -0,0 +1,76 @@
+from typing import Optional, Set, Tuple
+from datetime import datetime
+import asyncio
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from models import Order
+
+# Cursors order changes by updated_at, so resuming from one is only exact
+# while updated_at never goes backwards: a single writer, or app servers
+# whose clocks are kept in sync. A write stamped earlier than a cursor a
+# client already holds (clock skew between servers, or a long transaction
+# committing late) is not returned by changes_since for that cursor.
+
+
+def make_cursor(order: Order) -> str:
+    """Opaque resume point: the order's updated_at plus its id as a tie-breaker"""
+    return f"{order.updated_at.isoformat()}_{order.id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[datetime, int]:
+    updated_at, order_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(updated_at), int(order_id)
+
+
+def cursor_key(cursor: Optional[str]):
+    return parse_cursor(cursor) if cursor else (datetime.min, 0)
+
+
+def changes_since(db: Session, cursor: Optional[str], limit: int = 100):
+    """Orders created or updated after the cursor, oldest change first"""
+    query = db.query(Order)
+    if cursor:
+        query = query.filter(tuple_(Order.updated_at, Order.id) > tuple_(*parse_cursor(cursor)))
+    orders = query.order_by(Order.updated_at, Order.id).limit(limit).all()
+    return [change_event(order) for order in orders]
+
+
+def change_event(order: Order) -> dict:
+    return {
+        "cursor": make_cursor(order),
+        "order": jsonable_encoder(
+            {column.name: getattr(order, column.name) for column in Order.__table__.columns}
+        )
+    }
+
+
+class ChangeBus:
+    def __init__(self, queue_size: int = 1000):
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.queue_size = queue_size
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, order: Order):
+        """Fan an order write out to every live subscriber"""
+        event = change_event(order)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: end its stream so it resumes from its cursor
+                self.unsubscribe(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+# Create a global instance
+order_changes = ChangeBus()
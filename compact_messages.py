@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+from database import SessionLocal, engine
+from message_store import compact_messages, prepare_partitions
+from config import MESSAGE_RETENTION_DAYS, MESSAGE_RETENTION_MODE
+
+# Run at least monthly: it also creates the coming month's partition ahead of time
+print(f"Prepared message partitions: {prepare_partitions(engine)}")
+
+if MESSAGE_RETENTION_DAYS > 0:
+    db = SessionLocal()
+    try:
+        retired = compact_messages(
+            db,
+            datetime.utcnow() - timedelta(days=MESSAGE_RETENTION_DAYS),
+            archive=MESSAGE_RETENTION_MODE != "delete"
+        )
+        print(f"Compacted message partitions: {retired}")
+    finally:
+        db.close()
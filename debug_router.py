@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, Query
+from auth_router import get_current_admin
+from query_budget import report
+
+debug_router = APIRouter(
+    prefix="/debug",
+    tags=["debug"],
+)
+
+
+@debug_router.get("/query-stats")
+async def get_query_stats(
+    top: int = Query(10, ge=1, le=100),
+    current_admin=Depends(get_current_admin)
+):
+    """Endpoints with the most over-budget requests and queries among sampled requests"""
+    return {"endpoints": report.worst(top)}
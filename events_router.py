@@ -1,20 +1,14 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, BackgroundTasks, Query
 from typing import List, Optional
+from datetime import datetime
 from sqlalchemy.orm import Session
-from models import Message
+from message_store import add_message, message_history
 from schema import MessageSchema, WebSocketMessage
-from database import SessionLocal
+from database import get_db, get_read_db
 from websocket_manager import manager
 
 events_router = APIRouter(prefix="/messages", tags=["messages"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @events_router.post("/send")
 async def send_message(
     message: WebSocketMessage,
@@ -30,15 +24,14 @@ async def send_message(
     # Message to a specific client
     if message.client_id:
         # Store in database
-        db_message = Message(
+        db_message = add_message(
+            db,
             content=message.content,
             sender_id=sender_id,
             sender_name=sender_name,
             is_broadcast=False
         )
-        db.add(db_message)
         db.commit()
-        db.refresh(db_message)
         
         # Send via WebSocket if client is connected
         success = await manager.send_to_client(
@@ -62,15 +55,14 @@ async def send_message(
     # Broadcast message
     if message.content:
         # Save broadcast message
-        db_message = Message(
+        db_message = add_message(
+            db,
             content=message.content,
             sender_id=sender_id,
             sender_name=sender_name,
             is_broadcast=True
         )
-        db.add(db_message)
         db.commit()
-        db.refresh(db_message)
         
         # Broadcast to all connected clients
         recipients_count = await manager.broadcast(
@@ -96,20 +88,20 @@ async def send_message(
 async def get_message_history(
     client_id: Optional[str] = None,
     broadcast_only: bool = False,
-    db: Session = Depends(get_db)
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
 ):
-    """Get message history, either all broadcasts or filtered by client_id"""
-    query = db.query(Message)
-    
-    if broadcast_only:
-        # Only get broadcast messages
-        query = query.filter(Message.is_broadcast == True)
-    elif client_id:
-        # Get direct messages involving the given client
-        query = query.filter(
-            (Message.sender_id == client_id) | 
-            (Message.is_broadcast == True)
-        )
-    
-    messages = query.order_by(Message.timestamp.desc()).all()
-    return messages
\ No newline at end of file
+    """
+    Get message history, either all broadcasts or filtered by client_id.
+    Newest first; since/until narrow the partitions that are scanned.
+    """
+    return message_history(
+        db,
+        client_id=client_id,
+        broadcast_only=broadcast_only,
+        since=since,
+        until=until,
+        limit=limit
+    )
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Response, status
+from lifespan import lifecycle
+
+health_router = APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+
+@health_router.get("/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@health_router.get("/ready")
+async def readiness(response: Response):
+    """Schema checked, pools and caches warm, and not draining"""
+    if not lifecycle.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "draining" if lifecycle.draining else "starting"}
+    return {"status": "ready", "startup_ms": lifecycle.startup_ms}
@@ -0,0 +1,154 @@
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+import asyncio
+import signal
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+import models  # registers every table on Base.metadata
+from database import Base, SessionLocal, engine, replica_engines
+from message_store import prepare_partitions
+from notifications import notifications
+from websocket_manager import manager
+from config import DB_POOL_WARM_CONNECTIONS, SHUTDOWN_GRACE_SECONDS, SHUTDOWN_DRAIN_SECONDS
+
+# uvicorn (and gunicorn's uvicorn workers) stop on these
+SHUTDOWN_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class Lifecycle:
+    """Process state behind the readiness probe"""
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.startup_ms: Optional[float] = None
+        self.drain_ms: Optional[float] = None
+
+
+lifecycle = Lifecycle()
+
+
+def _warm_pool(db_engine, required: bool):
+    """Open pooled connections up front so early requests don't pay for connecting"""
+    pool = db_engine.pool
+    # Only QueuePool keeps several connections; the other pools hold one (or one per thread)
+    size = pool.size() if isinstance(pool, QueuePool) else 1
+    connections = []
+    try:
+        for _ in range(min(DB_POOL_WARM_CONNECTIONS, size)):
+            connection = db_engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        if required:
+            raise
+        # A cold replica only costs failover to the primary, not readiness
+        print(f"Replica warmup failed: {e}")
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def _prepare_database():
+    # Create tables if they don't exist
+    Base.metadata.create_all(bind=engine)
+    # Message partitions are made here and by compact_messages.py, not by writes
+    prepare_partitions(engine)
+    _warm_pool(engine, required=True)
+    for replica in replica_engines:
+        _warm_pool(replica, required=False)
+
+    db = SessionLocal()
+    try:
+        notifications.warm(db)
+    finally:
+        db.close()
+
+
+async def _drain():
+    """Fail readiness, then flush and hint every WebSocket; runs once per shutdown"""
+    lifecycle.ready = False
+    lifecycle.draining = True
+    if lifecycle.drain_ms is not None:
+        return
+    started = time.perf_counter()
+    drained = await manager.drain(SHUTDOWN_DRAIN_SECONDS)
+    lifecycle.drain_ms = (time.perf_counter() - started) * 1000
+    print(f"Drained {drained} WebSocket connections in {lifecycle.drain_ms:.0f} ms")
+
+
+def _forward_signal(handler, sig: int, frame):
+    """Hand a signal to the handler that was installed before ours"""
+    if callable(handler):
+        handler(sig, frame)
+    elif handler == signal.SIG_DFL:
+        signal.signal(sig, signal.SIG_DFL)
+        signal.raise_signal(sig)
+
+
+def _install_signal_handlers(loop: asyncio.AbstractEventLoop) -> Dict[int, object]:
+    """
+    Drain on SIGTERM/SIGINT before the server sees the signal. Once uvicorn
+    handles it, it closes every WebSocket with a bare 1012 and only then runs
+    the lifespan shutdown, which is too late for reconnect hints.
+    Returns the handlers replaced, to restore on shutdown.
+    """
+    # Signal handlers can only be installed from the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    previous = {sig: signal.getsignal(sig) for sig in SHUTDOWN_SIGNALS}
+    received = []
+    tasks = []
+
+    async def drain_then_stop(sig: int, frame):
+        if sig == signal.SIGTERM:
+            # Give load balancers time to see readiness fail before sockets go;
+            # SIGINT is someone at a terminal, so it drains straight away
+            await asyncio.sleep(SHUTDOWN_GRACE_SECONDS)
+        await _drain()
+        _forward_signal(previous[sig], sig, frame)
+
+    def handle(sig: int, frame):
+        if received:
+            # A second signal stops the server straight away
+            _forward_signal(previous[sig], sig, frame)
+            return
+        received.append(sig)
+        lifecycle.ready = False
+        lifecycle.draining = True
+        # Signal handlers interrupt the loop; schedule the drain through it
+        loop.call_soon_threadsafe(lambda: tasks.append(loop.create_task(drain_then_stop(sig, frame))))
+
+    for sig in SHUTDOWN_SIGNALS:
+        signal.signal(sig, handle)
+    return previous
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    lifecycle.draining = False
+    lifecycle.drain_ms = None
+    await run_in_threadpool(_prepare_database)
+    manager.start()
+    previous_handlers = _install_signal_handlers(asyncio.get_running_loop())
+    lifecycle.startup_ms = (time.perf_counter() - started) * 1000
+    lifecycle.ready = True
+    print(f"Startup finished in {lifecycle.startup_ms:.0f} ms")
+
+    yield
+
+    for sig, handler in previous_handlers.items():
+        signal.signal(sig, handler)
+    # Already done if a signal started the shutdown; covers every other way of stopping
+    await _drain()
+
+    engine.dispose()
+    for replica in replica_engines:
+        replica.dispose()
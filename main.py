@@ -3,19 +3,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from auth_router import auth_router
 from order_router import order_router
 from websocket_router import websocket_router
-from database import engine, Base
-from dotenv import load_dotenv
-import os
 from events_router import events_router
+from notification_router import notification_router
+from debug_router import debug_router
+from health_router import health_router
+from query_budget import QueryBudgetMiddleware
+from lifespan import lifespan
 
-load_dotenv()
-
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
-
+# Schema checks, pool warmup and WebSocket drain run in the lifespan, not at import
 app = FastAPI(
     title="Order Management API",
-    description="API for managing orders with real-time websocket communication"
+    description="API for managing orders with real-time websocket communication",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -30,6 +29,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Counts SQL per request against each endpoint's query budget (QUERY_BUDGET_MODE)
+app.add_middleware(QueryBudgetMiddleware)
+
 
 
 
@@ -38,6 +40,9 @@ app.include_router(auth_router)
 app.include_router(order_router)
 app.include_router(websocket_router)
 app.include_router(events_router)
+app.include_router(notification_router)
+app.include_router(debug_router)
+app.include_router(health_router)
 
 @app.get("/")
 async def root():
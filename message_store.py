@@ -0,0 +1,402 @@
+from typing import List, Optional, Set
+from datetime import datetime, timezone
+import re
+
+from sqlalchemy import Column, MetaData, Table, insert, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from database import Base
+from models import Message
+from query_budget import untracked
+
+# Monthly partitions, named messages_YYYYMM
+PARTITION_PATTERN = re.compile(r"^messages_(\d{4})(\d{2})$")
+# Live and archived partitions
+MESSAGE_TABLE_PATTERN = re.compile(r"^(archive_)?messages_\d{6}$")
+
+# Partitions known to exist, so writes skip the DDL
+_known_partitions: Set[str] = set()
+# SQLite partition tables are copies of the Message table
+_partition_metadata = MetaData()
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _period_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_period(start: datetime) -> datetime:
+    if start.month == 12:
+        return datetime(start.year + 1, 1, 1)
+    return datetime(start.year, start.month + 1, 1)
+
+
+def partition_name(value: datetime) -> str:
+    return f"messages_{value.year:04d}{value.month:02d}"
+
+
+def _partition_bounds(name: str):
+    year, month = PARTITION_PATTERN.match(name).groups()
+    start = datetime(int(year), int(month), 1)
+    return start, _next_period(start)
+
+
+def _partition_table(name: str) -> Table:
+    """
+    SQLite copy of the Message table with id as its only key; ids come from the
+    shared message_ids counter. SQLite does not enforce foreign keys here, so
+    they are left out.
+    """
+    table = _partition_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name,
+            _partition_metadata,
+            *[
+                Column(
+                    column.name,
+                    column.type,
+                    primary_key=column.name == "id",
+                    nullable=column.nullable and column.name != "id",
+                    index=column.index
+                )
+                for column in Message.__table__.columns
+            ]
+        )
+    return table
+
+
+def _create_partition(conn: Connection, name: str):
+    """Create a partition; one that already exists (say, made by another worker) is success"""
+    start, end = _partition_bounds(name)
+    if conn.dialect.name == "postgresql":
+        try:
+            with conn.begin_nested():
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+        except (IntegrityError, ProgrammingError):
+            # IF NOT EXISTS does not cover a concurrent CREATE: the loser gets a
+            # duplicate table or catalog unique violation once the winner commits
+            if not inspect(conn).has_table(name):
+                raise
+    else:
+        # Atomic under SQLite's single write lock
+        table = _partition_table(name)
+        conn.execute(CreateTable(table, if_not_exists=True))
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _message_tables(conn: Connection) -> List[str]:
+    return [
+        name for name in inspect(conn).get_table_names()
+        if name == "messages" or MESSAGE_TABLE_PATTERN.match(name)
+    ]
+
+
+def _prepare_id_counter(conn: Connection):
+    """
+    SQLite has no sequence shared between tables, so message ids come from a
+    one-row counter bumped in the writer's transaction. Make sure it exists and
+    is past every id already stored.
+    """
+    conn.execute(text("CREATE TABLE IF NOT EXISTS message_ids (last_id INTEGER NOT NULL)"))
+    highest = [
+        conn.execute(text(f"SELECT MAX(id) FROM {name}")).scalar() or 0
+        for name in _message_tables(conn)
+    ]
+    # Partitions from before the counter used AUTOINCREMENT, which never reuses ids
+    if conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'")).first():
+        highest.append(conn.execute(text(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence "
+            "WHERE name = 'messages' OR name GLOB 'messages_[0-9]*' "
+            "OR name GLOB 'archive_messages_[0-9]*'"
+        )).scalar())
+    highest = max(highest, default=0)
+    conn.execute(text(
+        "INSERT INTO message_ids (last_id) SELECT :highest "
+        "WHERE NOT EXISTS (SELECT 1 FROM message_ids)"
+    ), {"highest": highest})
+    conn.execute(text(
+        "UPDATE message_ids SET last_id = :highest WHERE last_id < :highest"
+    ), {"highest": highest})
+
+
+def prepare_partitions(bind, now: Optional[datetime] = None) -> List[str]:
+    """
+    Create this month's and next month's partitions (and SQLite's id counter)
+    ahead of the writes that need them. Run at startup and by compact_messages.py.
+    """
+    start = _period_start(now or datetime.utcnow())
+    names = [partition_name(start), partition_name(_next_period(start))]
+    with bind.connect() as conn:
+        if conn.dialect.name != "postgresql":
+            _prepare_id_counter(conn)
+        for name in names:
+            _create_partition(conn, name)
+        conn.commit()
+    _known_partitions.update(names)
+    return names
+
+
+def ensure_partition(db: Session, value: datetime) -> str:
+    """
+    Make sure the partition holding the given timestamp exists. prepare_partitions
+    normally made it already, so this is the fallback for a month it missed.
+    """
+    name = partition_name(value)
+    if name in _known_partitions:
+        return name
+
+    with untracked():
+        if _is_postgres(db):
+            # On a connection of its own, so the DDL and its lock on the parent
+            # are committed at once instead of held for the caller's transaction
+            with db.get_bind().connect() as conn:
+                _create_partition(conn, name)
+                conn.commit()
+            _known_partitions.add(name)
+        else:
+            # SQLite has one write lock for the whole file, so a second connection
+            # would wait on the caller's own transaction; create it in that
+            # transaction instead. Not cached, since the caller may roll back;
+            # repeating CREATE ... IF NOT EXISTS is a cheap no-op.
+            _create_partition(db.connection(), name)
+    return name
+
+
+def list_partitions(db: Session) -> List[str]:
+    """Names of live message partitions, oldest first"""
+    if _is_postgres(db):
+        rows = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'messages'::regclass"
+        ))
+    else:
+        rows = db.execute(text(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'table' AND name GLOB 'messages_[0-9]*'"
+        ))
+    return sorted(row[0] for row in rows if PARTITION_PATTERN.match(row[0]))
+
+
+def add_message(db: Session, **fields) -> Message:
+    """Store a message in its partition and return it; the caller commits"""
+    fields.setdefault("timestamp", datetime.utcnow())
+    name = ensure_partition(db, fields["timestamp"])
+
+    if _is_postgres(db):
+        message = Message(**fields)
+        db.add(message)
+        db.flush()
+        return message
+
+    fields.setdefault("is_broadcast", False)
+    # One counter for every partition keeps ids unique across months
+    fields["id"] = db.execute(text(
+        "UPDATE message_ids SET last_id = last_id + 1 RETURNING last_id"
+    )).scalar_one()
+    db.execute(insert(_partition_table(name)).values(**fields))
+    return Message(**fields)
+
+
+def message_history(
+    db: Session,
+    client_id: Optional[str] = None,
+    broadcast_only: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100
+) -> List[Message]:
+    """Newest-first messages, touching only partitions inside [since, until)"""
+    since = _naive_utc(since)
+    until = _naive_utc(until)
+
+    def apply_filters(query, model):
+        if broadcast_only:
+            query = query.filter(model.is_broadcast == True)
+        elif client_id:
+            query = query.filter(
+                (model.sender_id == client_id) |
+                (model.is_broadcast == True)
+            )
+        if since:
+            query = query.filter(model.timestamp >= since)
+        if until:
+            query = query.filter(model.timestamp < until)
+        return query.order_by(model.timestamp.desc())
+
+    if _is_postgres(db):
+        # The timestamp bounds let the planner prune partitions
+        return apply_filters(db.query(Message), Message).limit(limit).all()
+
+    # Walk partitions newest first and stop once the page is full
+    messages: List[Message] = []
+    for name in reversed(list_partitions(db)):
+        start, end = _partition_bounds(name)
+        if (until and start >= until) or (since and end <= since):
+            continue
+        model = aliased(Message, _partition_table(name), adapt_on_names=True)
+        messages.extend(
+            apply_filters(db.query(model), model).limit(limit - len(messages)).all()
+        )
+        if len(messages) >= limit:
+            break
+    return messages
+
+
+def compact_messages(db: Session, older_than: datetime, archive: bool = True) -> List[str]:
+    """
+    Retire every partition that ends before older_than in one statement each,
+    either renaming it to archive_messages_YYYYMM or dropping it outright.
+    """
+    older_than = _naive_utc(older_than)
+    postgres = _is_postgres(db)
+    retired = []
+
+    for name in list_partitions(db):
+        _, end = _partition_bounds(name)
+        if end > older_than:
+            break
+        if postgres:
+            db.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        if archive:
+            db.execute(text(f"ALTER TABLE {name} RENAME TO archive_{name}"))
+        else:
+            db.execute(text(f"DROP TABLE {name}"))
+        _known_partitions.discard(name)
+        table = _partition_metadata.tables.get(name)
+        if table is not None:
+            _partition_metadata.remove(table)
+        retired.append(name)
+
+    db.commit()
+    return retired
+
+
+def _add_missing_columns(db: Session, table_name: str):
+    """Add Message columns an older copy of the table was created without"""
+    existing = {column["name"] for column in inspect(db.connection()).get_columns(table_name)}
+    dialect = db.get_bind().dialect
+    for column in Message.__table__.columns:
+        if column.name not in existing:
+            db.execute(text(
+                f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}"
+            ))
+
+
+def _rename_legacy_table(db: Session):
+    """Move an unpartitioned Postgres messages table, and the names it holds, aside"""
+    db.execute(text("ALTER TABLE messages RENAME TO messages_legacy"))
+    db.execute(text("ALTER TABLE messages_legacy RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey"))
+    for index in inspect(db.connection()).get_indexes("messages_legacy"):
+        if index["name"].startswith("ix_messages_"):
+            legacy_name = index["name"].replace("ix_messages_", "ix_messages_legacy_", 1)
+            db.execute(text(f"ALTER INDEX {index['name']} RENAME TO {legacy_name}"))
+    db.execute(text("ALTER SEQUENCE IF EXISTS messages_id_seq RENAME TO messages_legacy_id_seq"))
+
+
+def _migrate_postgres(db: Session) -> int:
+    relkind = db.execute(text(
+        "SELECT relkind FROM pg_class "
+        "WHERE relname = 'messages' AND relnamespace = current_schema()::regnamespace"
+    )).scalar()
+    if relkind == "p":
+        return 0
+
+    if relkind is not None:
+        _rename_legacy_table(db)
+    Message.__table__.create(db.connection())
+    if relkind is None:
+        return 0
+
+    legacy_columns = {column["name"] for column in inspect(db.connection()).get_columns("messages_legacy")}
+    months = db.execute(text(
+        "SELECT DISTINCT date_trunc('month', COALESCE(timestamp, now() AT TIME ZONE 'utc')) "
+        "FROM messages_legacy"
+    )).scalars().all()
+    for month in months:
+        _create_partition(db.connection(), partition_name(month))
+
+    names = [column.name for column in Message.__table__.columns if column.name in legacy_columns]
+    selected = [
+        "COALESCE(timestamp, now() AT TIME ZONE 'utc')" if name == "timestamp" else name
+        for name in names
+    ]
+    moved = db.execute(text(
+        f"INSERT INTO messages ({', '.join(names)}) "
+        f"SELECT {', '.join(selected)} FROM messages_legacy"
+    )).rowcount
+    db.execute(text(
+        "SELECT setval('messages_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM messages), false)"
+    ))
+    return moved
+
+
+def _migrate_sqlite(db: Session) -> int:
+    tables = _message_tables(db.connection())
+    partitions = [name for name in tables if name != "messages"]
+    for name in partitions:
+        _add_missing_columns(db, name)
+    if "messages" not in tables:
+        _prepare_id_counter(db.connection())
+        return 0
+    _add_missing_columns(db, "messages")
+
+    # Base rows from before partitioning may share ids with partition rows;
+    # move those past every id in use
+    if partitions:
+        union = " UNION ALL ".join(f"SELECT id FROM {name}" for name in partitions)
+        offset = db.execute(text(
+            f"SELECT MAX(COALESCE((SELECT MAX(id) FROM ({union})), 0), COALESCE(MAX(id), 0)) FROM messages"
+        )).scalar()
+        db.execute(text(f"UPDATE messages SET id = id + :offset WHERE id IN ({union})"), {"offset": offset})
+    db.execute(
+        text("UPDATE messages SET timestamp = :now WHERE timestamp IS NULL"),
+        {"now": datetime.utcnow()}
+    )
+
+    names = ", ".join(column.name for column in Message.__table__.columns)
+    moved = 0
+    months = db.execute(text("SELECT DISTINCT substr(timestamp, 1, 7) FROM messages")).scalars().all()
+    for month in months:
+        start = datetime.strptime(month, "%Y-%m")
+        name = partition_name(start)
+        _create_partition(db.connection(), name)
+        moved += db.execute(text(
+            f"INSERT INTO {name} ({names}) SELECT {names} FROM messages "
+            "WHERE timestamp >= :start AND timestamp < :end"
+        ), {"start": str(start), "end": str(_next_period(start))}).rowcount
+    db.execute(text("DELETE FROM messages"))
+
+    # New ids continue past every id now in use
+    _prepare_id_counter(db.connection())
+    return moved
+
+
+def migrate_messages(db: Session) -> int:
+    """
+    Bring a messages table from before partitioning onto monthly partitions and
+    return how many rows were moved. Postgres keeps the old table as
+    messages_legacy; drop it once the copy is verified.
+    """
+    moved = _migrate_postgres(db) if _is_postgres(db) else _migrate_sqlite(db)
+    Base.metadata.create_all(bind=db.connection())
+    db.commit()
+    return moved
@@ -0,0 +1,9 @@
+from database import SessionLocal
+from message_store import migrate_messages
+
+db = SessionLocal()
+try:
+    moved = migrate_messages(db)
+    print(f"Moved {moved} messages into monthly partitions")
+finally:
+    db.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Text, Float, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Text, Float, DateTime, Index, Sequence
 from sqlalchemy.orm import relationship
 from sqlalchemy_utils import ChoiceType
 from database import Base
@@ -39,8 +39,19 @@ class Order(Base):
         ('Delivered', 'Delivered'),
         ('Canceled', 'Canceled')
     ]
+    # Statuses each status may move to; Delivered and Canceled are final
+    STATUS_TRANSITIONS = {
+        'Pending': ('Confirmed', 'Canceled'),
+        'Confirmed': ('Delivered', 'Canceled'),
+        'Delivered': (),
+        'Canceled': (),
+    }
     
     __tablename__ = 'orders'
+    # Serves the (updated_at, id) cursor scans of the order change feed
+    __table_args__ = (
+        Index('ix_orders_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(100), nullable=False)
@@ -67,19 +78,45 @@ class Order(Base):
 
 class Message(Base):
     __tablename__ = 'messages'
+    # Partitioned by month on timestamp: natively on Postgres (which needs the
+    # partition key in the primary key), as messages_YYYYMM tables elsewhere.
+    # Read and write through message_store rather than querying this directly.
+    __table_args__ = {
+        'postgresql_partition_by': 'RANGE (timestamp)',
+    }
     
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # The primary key is composite, so Postgres ids come from an explicit sequence
+    id = Column(Integer, Sequence('messages_id_seq'), primary_key=True, index=True)
     content = Column(Text, nullable=False)
     sender_id = Column(String(50), nullable=True)  # ID or username of sender
     sender_name = Column(String(100), nullable=True)  # Name of sender
     is_broadcast = Column(Boolean, default=False)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        nullable=False,
+        index=True,
+        primary_key=True
+    )
+    
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    admin_id = Column(Integer, ForeignKey('admin.id'), nullable=True)
+    recipient_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    
+    user = relationship('User', foreign_keys=[user_id], back_populates='messages_sent')
+    admin = relationship('Admin', foreign_keys=[admin_id], back_populates='messages')
+    recipient = relationship('User', foreign_keys=[recipient_id], back_populates='messages_received')
     
     def __repr__(self):
         return f"<Message {self.id}>"
 
 class Notification(Base):
     __tablename__ = 'notifications'
+    # Inbox pages and unread counts are always scoped to one recipient
+    __table_args__ = (
+        Index('ix_notifications_user_id_id', 'user_id', 'id'),
+        Index('ix_notifications_admin_id_id', 'admin_id', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     content = Column(Text, nullable=False)
@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, BackgroundTasks, Query
+from typing import List, Optional
+from schema import NotificationSchema, MarkReadModel
+from database import get_db, get_read_db
+from auth_router import get_current_user, get_current_admin
+from notifications import notifications
+from query_budget import query_budget
+
+notification_router = APIRouter(
+    prefix="/notifications",
+    tags=["notifications"],
+)
+
+
+def get_user_recipient(current_user=Depends(get_current_user)):
+    return ("user", current_user.id)
+
+
+def get_admin_recipient(current_admin=Depends(get_current_admin)):
+    return ("admin", current_admin.id)
+
+
+def _inbox(recipient, before_id: Optional[int], limit: int, db):
+    return notifications.inbox(db, recipient, before_id, limit)
+
+
+def _unread_count(recipient, db):
+    return {"unread": notifications.unread_count(db, recipient)}
+
+
+def _mark_read(recipient, body: MarkReadModel, background_tasks: BackgroundTasks, db):
+    marked = notifications.mark_read(db, recipient, body.notification_ids)
+    db.commit()
+    if marked:
+        background_tasks.add_task(notifications.push_unread, [recipient])
+    return {"marked_read": marked, "unread": notifications.unread.get(recipient, 0)}
+
+
+@notification_router.get("/", response_model=List[NotificationSchema])
+@query_budget(2)
+async def get_notifications(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    recipient=Depends(get_user_recipient),
+    db=Depends(get_read_db)
+):
+    """Newest-first page of the current user's notifications"""
+    return _inbox(recipient, before_id, limit, db)
+
+
+@notification_router.get("/unread-count")
+@query_budget(2)
+async def get_unread_count(recipient=Depends(get_user_recipient), db=Depends(get_db)):
+    """Current user's unread count, served from memory"""
+    return _unread_count(recipient, db)
+
+
+@notification_router.post("/mark-read")
+@query_budget(3)
+async def mark_notifications_read(
+    body: MarkReadModel,
+    background_tasks: BackgroundTasks,
+    recipient=Depends(get_user_recipient),
+    db=Depends(get_db)
+):
+    """Mark the listed notifications read, or all of them when none are listed"""
+    return _mark_read(recipient, body, background_tasks, db)
+
+
+@notification_router.get("/admin", response_model=List[NotificationSchema])
+@query_budget(2)
+async def get_admin_notifications(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    recipient=Depends(get_admin_recipient),
+    db=Depends(get_read_db)
+):
+    """Newest-first page of the current admin's notifications"""
+    return _inbox(recipient, before_id, limit, db)
+
+
+@notification_router.get("/admin/unread-count")
+@query_budget(2)
+async def get_admin_unread_count(recipient=Depends(get_admin_recipient), db=Depends(get_db)):
+    """Current admin's unread count, served from memory"""
+    return _unread_count(recipient, db)
+
+
+@notification_router.post("/admin/mark-read")
+@query_budget(3)
+async def mark_admin_notifications_read(
+    body: MarkReadModel,
+    background_tasks: BackgroundTasks,
+    recipient=Depends(get_admin_recipient),
+    db=Depends(get_db)
+):
+    """Mark the listed notifications read, or all of them when none are listed"""
+    return _mark_read(recipient, body, background_tasks, db)
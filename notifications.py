@@ -0,0 +1,150 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Admin, Notification
+from query_budget import untracked
+from websocket_manager import account_client_id, manager
+
+# A recipient is ("user", id) or ("admin", id)
+Recipient = Tuple[str, int]
+
+
+def client_id_for(recipient: Recipient) -> str:
+    """WebSocket client ID bound to the recipient's token: the user ID, or admin:<id>"""
+    kind, recipient_id = recipient
+    return account_client_id(kind, recipient_id)
+
+
+def _column(kind: str):
+    return Notification.user_id if kind == "user" else Notification.admin_id
+
+
+class NotificationService:
+    def __init__(self):
+        # Unread notifications per recipient, kept current as events arrive
+        self.unread: Dict[Recipient, int] = {}
+        self._warmed = False
+
+    def warm(self, db: Session):
+        """Load every recipient's unread count with one grouped query"""
+        # A one-off cache fill, not part of whichever request triggers it
+        with untracked():
+            rows = db.query(
+                Notification.user_id, Notification.admin_id, func.count(Notification.id)
+            ).filter(
+                Notification.is_read == False
+            ).group_by(Notification.user_id, Notification.admin_id).all()
+
+        unread: Dict[Recipient, int] = {}
+        for user_id, admin_id, count in rows:
+            if user_id is not None:
+                unread[("user", user_id)] = unread.get(("user", user_id), 0) + count
+            if admin_id is not None:
+                unread[("admin", admin_id)] = unread.get(("admin", admin_id), 0) + count
+        self.unread = unread
+        self._warmed = True
+
+    def _ensure_warm(self, db: Session):
+        if not self._warmed:
+            self.warm(db)
+
+    def unread_count(self, db: Session, recipient: Recipient) -> int:
+        """Served from memory; only the very first call after startup queries"""
+        self._ensure_warm(db)
+        return self.unread.get(recipient, 0)
+
+    def _bump(self, db: Session, recipients: Iterable[Recipient], delta: int = 1) -> List[Recipient]:
+        """Adjust unread counts once the caller's transaction commits"""
+        changed = list(recipients)
+        db.info.setdefault("unread_bumps", []).extend((recipient, delta) for recipient in changed)
+        return changed
+
+    def _apply_bumps(self, bumps: Iterable[Tuple[Recipient, int]]):
+        for recipient, delta in bumps:
+            self.unread[recipient] = max(self.unread.get(recipient, 0) + delta, 0)
+
+    def notify_users(self, db: Session, notes: List[Tuple[int, str]]) -> List[Recipient]:
+        """Write (user_id, content) notifications in one multi-row INSERT; the caller commits"""
+        if not notes:
+            return []
+        self._ensure_warm(db)
+        now = datetime.utcnow()
+        db.execute(insert(Notification).values([
+            {"user_id": user_id, "content": content, "is_read": False, "timestamp": now}
+            for user_id, content in notes
+        ]))
+        return self._bump(db, (("user", user_id) for user_id, _ in notes))
+
+    def notify_admins(self, db: Session, content: str) -> List[Recipient]:
+        """Write one notification per staff admin with a single INSERT ... SELECT; the caller commits"""
+        self._ensure_warm(db)
+        admin_ids = db.scalars(
+            insert(Notification).from_select(
+                ["admin_id", "content", "is_read", "timestamp"],
+                select(Admin.id, literal(content), literal(False), literal(datetime.utcnow()))
+                .where(Admin.is_staff == True)
+            ).returning(Notification.admin_id)
+        ).all()
+        return self._bump(db, (("admin", admin_id) for admin_id in admin_ids))
+
+    def inbox(
+        self,
+        db: Session,
+        recipient: Recipient,
+        before_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Notification]:
+        """Newest-first page of notifications; pass the last id as before_id for the next page"""
+        kind, recipient_id = recipient
+        query = db.query(Notification).filter(_column(kind) == recipient_id)
+        if before_id is not None:
+            query = query.filter(Notification.id < before_id)
+        return query.order_by(Notification.id.desc()).limit(limit).all()
+
+    def mark_read(
+        self,
+        db: Session,
+        recipient: Recipient,
+        notification_ids: Optional[List[int]] = None
+    ) -> int:
+        """Mark the given (or all) unread notifications read in a single UPDATE; the caller commits"""
+        self._ensure_warm(db)
+        kind, recipient_id = recipient
+        statement = update(Notification).where(
+            _column(kind) == recipient_id,
+            Notification.is_read == False
+        )
+        if notification_ids is not None:
+            statement = statement.where(Notification.id.in_(notification_ids))
+        result = db.execute(
+            statement.values(is_read=True),
+            execution_options={"synchronize_session": False}
+        )
+        if result.rowcount:
+            self._bump(db, [recipient], -result.rowcount)
+        return result.rowcount
+
+    async def push_unread(self, recipients: Iterable[Recipient]):
+        """Send each recipient its current unread count over /ws, if connected"""
+        for recipient in set(recipients):
+            await manager.send_to_client(
+                client_id_for(recipient),
+                {"type": "unread_count", "count": self.unread.get(recipient, 0)}
+            )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_unread_bumps(session):
+    notifications._apply_bumps(session.info.pop("unread_bumps", ()))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _drop_unread_bumps(session):
+    session.info.pop("unread_bumps", None)
+
+# Create a global instance
+notifications = NotificationService()
@@ -1,41 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Optional
+from collections import defaultdict
+from datetime import datetime
+import asyncio
+import json
+from sqlalchemy import update
 from models import Order
-from schema import UserSchema, OrderModel
-from database import SessionLocal
-from auth_router import get_current_user
-from websocket_manager import manager
+from schema import UserSchema, OrderModel, OrderStatusUpdateModel
+from database import SessionLocal, get_db, get_read_db
+from auth_router import get_current_user, get_current_admin
+from websocket_manager import account_client_id, manager
+from change_feed import changes_since, cursor_key, order_changes
+from notifications import notifications
+from query_budget import query_budget
 
 order_router = APIRouter(
     prefix="/orders",
     tags=["orders"],
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-
-
-
 @order_router.get("/", response_model=List[OrderModel])
-async def get_orders(db=Depends(get_db)):
+@query_budget(1)
+async def get_orders(db=Depends(get_read_db)):
     orders = db.query(Order).all()
     return orders
 
 
 @order_router.get("/status/{status}", response_model=List[OrderModel])
+@query_budget(2)
 async def get_orders_by_status(
     status: str,
     current_user: UserSchema = Depends(get_current_user),
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     """Get orders by status"""
-    if current_user.is_staff:
+    if getattr(current_user, "is_staff", False):
         orders = db.query(Order).filter(Order.order_status == status).all()
     else:
         orders = db.query(Order).filter(
@@ -44,11 +45,110 @@ async def get_orders_by_status(
         ).all()
     return orders
 
+@order_router.get("/changes")
+async def get_order_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(25, ge=0, le=60),
+    last_event_id: Optional[str] = Header(None),
+    current_admin=Depends(get_current_admin),
+    db=Depends(get_db)
+):
+    """
+    Orders created or updated after the `since` cursor, oldest first (staff only).
+    - Accept: text/event-stream streams the backlog and then live changes
+      as Server-Sent Events; reconnects resume from Last-Event-ID.
+    - Otherwise long-polls: returns as soon as there is at least one change,
+      or an empty page after `wait` seconds. Pass back `cursor` as `since`.
+    """
+    # The admin lookup is done; don't hold its connection for a long wait or stream
+    db.close()
+
+    since = since or last_event_id
+    try:
+        cursor_key(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Subscribe before reading the backlog so no write falls in between
+    queue = order_changes.subscribe()
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _stream_order_changes(queue, since, limit),
+            media_type="text/event-stream"
+        )
+
+    try:
+        changes = await run_in_threadpool(_read_changes, since, limit)
+        if not changes and wait:
+            try:
+                await asyncio.wait_for(queue.get(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                changes = await run_in_threadpool(_read_changes, since, limit)
+    finally:
+        order_changes.unsubscribe(queue)
+
+    return {
+        "changes": changes,
+        "cursor": changes[-1]["cursor"] if changes else since
+    }
+
+
+def _read_changes(cursor: Optional[str], limit: int):
+    # Short-lived session: a stream can outlive any request-scoped one
+    db = SessionLocal()
+    try:
+        return changes_since(db, cursor, limit)
+    finally:
+        db.close()
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['cursor']}\nevent: order\ndata: {json.dumps(event['order'])}\n\n"
+
+
+async def _stream_order_changes(queue: asyncio.Queue, cursor: Optional[str], limit: int):
+    try:
+        # Catch up from the database page by page
+        while True:
+            changes = await run_in_threadpool(_read_changes, cursor, limit)
+            for event in changes:
+                yield _sse(event)
+            if changes:
+                cursor = changes[-1]["cursor"]
+            if len(changes) < limit:
+                break
+
+        # Then follow the live bus, skipping anything the backlog already sent.
+        # Live events are compared with the end of the backlog only, not with
+        # each other, so a write stamped slightly out of order is still sent.
+        backlog_key = cursor_key(cursor)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                # Fell too far behind; the client reconnects from its last id
+                break
+            if cursor_key(event["cursor"]) <= backlog_key:
+                continue
+            yield _sse(event)
+    finally:
+        order_changes.unsubscribe(queue)
+
+
 @order_router.get("/{order_id}", response_model=OrderModel)
+@query_budget(2)
 async def get_order(
     order_id: int, 
     current_user: UserSchema = Depends(get_current_user),
-    db=Depends(get_db)
+    db=Depends(get_read_db)
 ):
     """Get a specific order by ID"""
     order = db.query(Order).filter(Order.id == order_id).first()
@@ -56,12 +156,13 @@ async def get_order(
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Check if user is authorized to view this order
-    if not current_user.is_staff and order.user_id != current_user.id:
+    if not getattr(current_user, "is_staff", False) and order.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this order")
     
     return order
 
 @order_router.post("/create", response_model=OrderModel)
+@query_budget(5)
 async def create_order(
     order: OrderModel,
     background_tasks: BackgroundTasks,
@@ -84,8 +185,15 @@ async def create_order(
         user_id=current_user.id
     )
     db.add(new_order)
+    db.flush()
+    # Same transaction as the order, so neither is written without the other
+    notified = notifications.notify_admins(
+        db, f"New order #{new_order.id}: {new_order.product_name}"
+    )
     db.commit()
     db.refresh(new_order)
+    order_changes.publish(new_order)
+    background_tasks.add_task(notifications.push_unread, notified)
     
     # Notify admins about the new order
     background_tasks.add_task(
@@ -100,4 +208,78 @@ async def create_order(
         }
     )
     
-    return new_order
\ No newline at end of file
+    return new_order
+
+
+@order_router.patch("/status")
+@query_budget(4)
+async def update_order_status(
+    update_request: OrderStatusUpdateModel,
+    background_tasks: BackgroundTasks,
+    current_admin=Depends(get_current_admin),
+    db=Depends(get_db)
+):
+    """
+    Move a batch of orders to a new status in a single UPDATE ... RETURNING.
+    Orders that don't exist or can't make the transition are reported as skipped.
+    """
+    target = update_request.status
+    # Keep the first occurrence of each id, in request order
+    order_ids = list(dict.fromkeys(update_request.order_ids))
+    if target not in dict(Order.ORDER_STATUS):
+        raise HTTPException(status_code=400, detail="Invalid order status")
+    if not order_ids:
+        raise HTTPException(status_code=400, detail="No orders provided")
+    if len(order_ids) > 1000:
+        raise HTTPException(status_code=400, detail="Too many orders in one batch")
+
+    allowed_from = [
+        status for status, targets in Order.STATUS_TRANSITIONS.items() if target in targets
+    ]
+    if not allowed_from:
+        raise HTTPException(status_code=400, detail=f"No order can move to {target}")
+
+    orders = db.scalars(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.order_status.in_(allowed_from))
+        .values(order_status=target, updated_at=datetime.utcnow())
+        .returning(Order),
+        execution_options={"synchronize_session": False}
+    ).all()
+    # Detach so the returned rows stay loaded instead of expiring on commit
+    for order in orders:
+        db.expunge(order)
+
+    notified = notifications.notify_users(db, [
+        (order.user_id, f"Order #{order.id} is now {target}")
+        for order in orders if order.user_id is not None
+    ])
+    db.commit()
+
+    # One coalesced event per affected user rather than one per order
+    by_user: Dict[int, List[int]] = defaultdict(list)
+    for order in orders:
+        order_changes.publish(order)
+        if order.user_id is not None:
+            by_user[order.user_id].append(order.id)
+
+    background_tasks.add_task(notifications.push_unread, notified)
+
+    for user_id, order_ids in by_user.items():
+        background_tasks.add_task(
+            manager.send_to_client,
+            account_client_id("user", user_id),
+            {
+                "type": "order_status_changed",
+                "status": target,
+                "order_ids": order_ids
+            }
+        )
+
+    updated = [order.id for order in orders]
+    updated_set = set(updated)
+    return {
+        "status": target,
+        "updated": updated,
+        "skipped": [order_id for order_id in order_ids if order_id not in updated_set]
+    }
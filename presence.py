@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Set
+from fastapi import WebSocket
+from itertools import islice
+import asyncio
+
+from config import PRESENCE_DEBOUNCE_MS
+from websocket_manager import manager
+
+class PresenceService:
+    def __init__(self, debounce_ms: int = PRESENCE_DEBOUNCE_MS):
+        # Current online state: client ID -> display name
+        self.online: Dict[str, str] = {}
+        # What subscribers were last told, so a join+leave inside one window cancels out
+        self._published: Dict[str, str] = {}
+        self._dirty: Set[str] = set()
+        self.subscribers: Set[WebSocket] = set()
+        self.debounce = debounce_ms / 1000
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def join(self, client_id: str, client_name: str):
+        """Mark a client online; subscribers hear about it on the next flush"""
+        self.online[client_id] = client_name
+        self._mark_dirty(client_id)
+
+    def leave(self, client_id: str):
+        """Mark a client offline; subscribers hear about it on the next flush"""
+        if self.online.pop(client_id, None) is not None:
+            self._mark_dirty(client_id)
+
+    def _mark_dirty(self, client_id: str):
+        self._dirty.add(client_id)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        """Wait out the debounce window, then publish one coalesced diff"""
+        await asyncio.sleep(self.debounce)
+        self._flush_task = None
+        dirty, self._dirty = self._dirty, set()
+
+        joined = []
+        left = []
+        for client_id in dirty:
+            name = self.online.get(client_id)
+            if name == self._published.get(client_id):
+                continue
+            if name is None:
+                del self._published[client_id]
+                left.append(client_id)
+            else:
+                self._published[client_id] = name
+                joined.append({"client_id": client_id, "client_name": name})
+
+        if not joined and not left:
+            return
+
+        diff = {
+            "type": "presence_diff",
+            "joined": joined,
+            "left": left,
+            "online_count": len(self.online)
+        }
+        for websocket in list(self.subscribers):
+            if not await manager.send_message(websocket, diff):
+                self.subscribers.discard(websocket)
+
+    async def subscribe(self, websocket: WebSocket):
+        """Subscribe a websocket to presence diffs"""
+        self.subscribers.add(websocket)
+        await manager.send_message(
+            websocket,
+            {"type": "presence_snapshot", "online_count": len(self.online)}
+        )
+
+    def unsubscribe(self, websocket: WebSocket):
+        """Stop sending presence diffs to a websocket"""
+        self.subscribers.discard(websocket)
+
+    def count(self) -> int:
+        """Number of identified clients currently online"""
+        return len(self.online)
+
+    def list_online(self, offset: int = 0, limit: int = 100) -> List[dict]:
+        """Get a page of online clients"""
+        return [
+            {"client_id": client_id, "client_name": name}
+            for client_id, name in islice(self.online.items(), offset, offset + limit)
+        ]
+
+# Create a global instance
+presence = PresenceService()
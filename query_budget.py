@@ -0,0 +1,175 @@
+from typing import Callable, Dict, List, Optional
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+import re
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Read at call time so the mode can be changed without a restart (and in tests)
+import config
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """Statements run while tracking one request (or one track_queries block)"""
+    __slots__ = ("count", "total_time", "statements", "budget", "scope")
+
+    def __init__(self, budget: Optional[int] = None, scope: Optional[dict] = None):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Counter = Counter()
+        self.budget = budget
+        self.scope = scope
+
+    def current_budget(self) -> Optional[int]:
+        if self.budget is not None:
+            return self.budget
+        endpoint = self.scope.get("endpoint") if self.scope else None
+        return getattr(endpoint, "query_budget", None)
+
+    def duplicates(self, threshold: Optional[int] = None) -> Dict[str, int]:
+        """Statements repeated often enough to look like an N+1"""
+        if threshold is None:
+            threshold = config.N_PLUS_ONE_THRESHOLD
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Collapse IN-lists of bound parameters so lookups of any batch size share one pattern
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the per-statement context, which is discarded whether or not the
+    # statement succeeds; after_cursor_execute doesn't run for a failed one
+    if _current.get() is not None:
+        context._query_budget_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = getattr(context, "_query_budget_start", None)
+    if started is not None:
+        stats.total_time += time.perf_counter() - started
+    stats.count += 1
+    stats.statements[normalize(statement)] += 1
+
+    budget = stats.current_budget()
+    if config.QUERY_BUDGET_MODE == "strict" and budget is not None and stats.count > budget:
+        raise QueryBudgetExceeded(
+            f"{stats.count} queries exceed the budget of {budget}: {stats.duplicates(2) or statement}"
+        )
+
+
+@contextmanager
+def track_queries(budget: Optional[int] = None):
+    """Count the SQL run inside the block, e.g. `with track_queries() as stats:`"""
+    stats = QueryStats(budget)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if budget is not None and stats.count > budget:
+        raise QueryBudgetExceeded(f"{stats.count} queries exceed the budget of {budget}")
+
+
+@contextmanager
+def untracked():
+    """Leave infrastructure SQL (health checks, DDL, cache warmup) out of the count"""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def query_budget(max_queries: int) -> Callable:
+    """Declare how many statements an endpoint may run; place below the route decorator"""
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorator
+
+
+class QueryReport:
+    """Worst sampled request seen per endpoint"""
+
+    def __init__(self):
+        self.endpoints: Dict[str, dict] = {}
+
+    def record(self, name: str, stats: QueryStats):
+        entry = self.endpoints.get(name)
+        if entry is None:
+            entry = self.endpoints[name] = {
+                "endpoint": name,
+                "budget": stats.current_budget(),
+                "requests": 0,
+                "over_budget": 0,
+                "max_queries": 0,
+                "max_db_time_ms": 0.0,
+                "duplicates": {},
+            }
+        entry["requests"] += 1
+        budget = entry["budget"]
+        if budget is not None and stats.count > budget:
+            entry["over_budget"] += 1
+        if stats.count > entry["max_queries"]:
+            entry["max_queries"] = stats.count
+            entry["duplicates"] = stats.duplicates()
+        entry["max_db_time_ms"] = max(entry["max_db_time_ms"], stats.total_time * 1000)
+
+    def worst(self, top: int = 10) -> List[dict]:
+        return sorted(
+            self.endpoints.values(),
+            key=lambda entry: (entry["over_budget"], entry["max_queries"], entry["max_db_time_ms"]),
+            reverse=True
+        )[:top]
+
+
+report = QueryReport()
+
+
+class QueryBudgetMiddleware:
+    """Tracks SQL per HTTP request: every request in strict mode, a sample otherwise"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        mode = config.QUERY_BUDGET_MODE
+        if scope["type"] != "http" or mode == "off":
+            return await self.app(scope, receive, send)
+        if mode != "strict" and random.random() >= config.QUERY_BUDGET_SAMPLE_RATE:
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats(scope=scope)
+        token = _current.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                name = f"{scope['method']} {getattr(route, 'path', route)}"
+                report.record(name, stats)
+                duplicates = stats.duplicates()
+                if duplicates:
+                    print(f"Possible N+1 in {name}: {duplicates}")
@@ -98,6 +98,37 @@ class OrderModel(OrderCreateModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class OrderStatusUpdateModel(BaseModel):
+    order_ids: List[int]
+    status: str
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "order_ids": [1, 2, 3],
+                "status": "Confirmed"
+            }
+        }
+
+class NotificationSchema(BaseModel):
+    id: int
+    content: str
+    is_read: bool
+    timestamp: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class MarkReadModel(BaseModel):
+    notification_ids: Optional[List[int]] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "notification_ids": [4, 5, 6]
+            }
+        }
+
 class MessageSchema(BaseModel):
     id: Optional[int] = None
     content: str
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+
+# The app is a set of top-level modules; make them importable from tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at a throwaway SQLite file before anything imports database.py
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+
+import itertools
+
+import pytest
+
+_emails = itertools.count()
+
+
+@pytest.fixture
+def client():
+    """The full app, started through its lifespan"""
+    from fastapi.testclient import TestClient
+    from main import app
+    from websocket_manager import manager
+
+    with TestClient(app) as client:
+        yield client
+    # Shutdown drained the shared manager; let later tests connect again
+    manager.draining = False
+
+
+def _make_account(model, **fields):
+    from auth_router import create_access_token
+    from database import SessionLocal
+
+    n = next(_emails)
+    db = SessionLocal()
+    try:
+        account = model(username=f"{model.__tablename__}{n}", email=f"{model.__tablename__}{n}@example.com", **fields)
+        db.add(account)
+        db.commit()
+        return account.id, {"Authorization": f"Bearer {create_access_token({'sub': account.email})}"}
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def admin(client):
+    """(id, auth headers) of a staff admin"""
+    from models import Admin
+    return _make_account(Admin, password="x", is_staff=True, is_active=True)
+
+
+@pytest.fixture
+def user(client):
+    """(id, auth headers) of a customer"""
+    from models import User
+    return _make_account(User)
@@ -0,0 +1,17 @@
+class FakeWebSocket:
+    """Records what the manager sends instead of writing to a network socket"""
+
+    def __init__(self):
+        self.frames = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        if self.closed_with is not None:
+            raise RuntimeError("socket closed")
+        self.frames.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from fakes import FakeWebSocket
+from websocket_manager import WebSocketManager
+
+
+def test_registry_indexes_by_socket_and_id():
+    async def scenario():
+        manager = WebSocketManager()
+        named, anonymous = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(named, "a", name="Ann")
+        await manager.connect(anonymous)
+
+        assert manager.connections["a"].websocket is named
+        assert manager.sockets[named].name == "Ann"
+        clients = await manager.get_connected_clients()
+        assert clients == {
+            "connected_clients": ["a"],
+            "anonymous_clients_count": 1,
+            "total_clients": 2
+        }
+
+        manager.disconnect(named, "a")
+        manager.disconnect(anonymous)
+        assert manager.sockets == {} and manager.connections == {}
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_keeps_the_newer_socket():
+    async def scenario():
+        manager = WebSocketManager()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(old, "a")
+        await manager.connect(new, "a")
+        assert old.closed_with is not None
+
+        # The old socket's handler disconnects late; the new entry must survive
+        manager.disconnect(old, "a")
+        assert manager.connections["a"].websocket is new
+
+    asyncio.run(scenario())
+
+
+def test_counters_and_failed_sends_clean_up():
+    async def scenario():
+        manager = WebSocketManager()
+        alive, dead = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(alive, "alive")
+        await manager.connect(dead, "dead")
+        await dead.close()
+
+        await manager.broadcast({"type": "hello"})
+        manager.record_received(alive)
+
+        conn = manager.sockets[alive]
+        assert (conn.sent, conn.received) == (1, 1)
+        assert dead not in manager.sockets and "dead" not in manager.connections
+
+    asyncio.run(scenario())
+
+
+def test_admin_broadcast_reaches_only_admins():
+    async def scenario():
+        manager = WebSocketManager()
+        admin, user = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(admin, "admin:1", roles=frozenset({"admin"}))
+        await manager.connect(user, "1")
+
+        assert await manager.broadcast_to_admins({"type": "new_order"}) == 1
+        assert [json.loads(frame) for frame in admin.frames] == [{"type": "new_order"}]
+        assert user.frames == []
+
+        manager.disconnect(admin)
+        assert manager.admins == set()
+
+    asyncio.run(scenario())
@@ -0,0 +1,103 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from websockets.sync.client import connect
+
+from lifespan import _warm_pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GRACE_SECONDS = 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def readiness(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready", timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{tmp_path}/server.db",
+        DATABASE_REPLICA_URLS="",
+        SHUTDOWN_GRACE_SECONDS=str(GRACE_SECONDS),
+        SHUTDOWN_DRAIN_SECONDS="5",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if readiness(port) == 200:
+                    break
+            except OSError:
+                pass
+            assert process.poll() is None and time.monotonic() < deadline, "server did not become ready"
+            time.sleep(0.1)
+        yield process, port
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def test_sigterm_drains_websockets_before_uvicorn_closes_them(server):
+    process, port = server
+    with connect(f"ws://127.0.0.1:{port}/ws?client_id=c1&batch_ms=20") as ws:
+        assert json.loads(ws.recv())
+
+        process.send_signal(signal.SIGTERM)
+        # Readiness fails at once while the socket stays open through the grace period
+        time.sleep(GRACE_SECONDS / 4)
+        assert readiness(port) == 503
+
+        frame = json.loads(ws.recv(timeout=GRACE_SECONDS + 5))
+        hints = frame if isinstance(frame, list) else [frame]
+        assert hints[-1]["type"] == "reconnect"
+        assert hints[-1]["retry_after_ms"] > 0
+        with pytest.raises(Exception):
+            ws.recv(timeout=5)
+        assert ws.close_code == 1012
+
+    assert process.wait(timeout=10) is not None
+
+
+@pytest.mark.parametrize("pool", [SingletonThreadPool, StaticPool])
+def test_warm_pool_handles_single_connection_pools(pool):
+    _warm_pool(create_engine("sqlite://", poolclass=pool), required=True)
+
+
+def test_sigint_drains_without_the_grace_period(server):
+    process, port = server
+    with connect(f"ws://127.0.0.1:{port}/ws?client_id=c1") as ws:
+        assert json.loads(ws.recv())
+
+        started = time.monotonic()
+        process.send_signal(signal.SIGINT)
+        assert json.loads(ws.recv(timeout=5))["type"] == "reconnect"
+        assert time.monotonic() - started < GRACE_SECONDS / 2
+
+    assert process.wait(timeout=10) is not None
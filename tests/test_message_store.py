@@ -0,0 +1,126 @@
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import MetaData, create_engine, inspect, text
+
+import message_store
+from database import Base, SessionLocal
+from message_store import (
+    add_message, compact_messages, ensure_partition, message_history, migrate_messages, prepare_partitions
+)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/messages.db")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(message_store, "_known_partitions", set())
+    monkeypatch.setattr(message_store, "_partition_metadata", MetaData())
+    prepare_partitions(engine, datetime(2026, 1, 15))
+    session = SessionLocal(bind=engine)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def tables(db):
+    return set(inspect(db.connection()).get_table_names())
+
+
+def test_messages_land_in_their_month(db):
+    january = add_message(db, content="a", sender_id="1", timestamp=datetime(2026, 1, 5))
+    february = add_message(db, content="b", sender_id="1", timestamp=datetime(2026, 2, 5))
+    db.commit()
+
+    assert {"messages_202601", "messages_202602"} <= tables(db)
+    assert february.id > january.id
+    assert db.execute(text("SELECT COUNT(*) FROM messages")).scalar() == 0
+
+
+def test_history_walks_partitions_newest_first(db):
+    for month in (1, 2, 3):
+        add_message(db, content=f"m{month}", sender_id="1", timestamp=datetime(2026, month, 10))
+    db.commit()
+
+    assert [m.content for m in message_history(db, limit=2)] == ["m3", "m2"]
+    assert [m.content for m in message_history(db, since=datetime(2026, 2, 1), until=datetime(2026, 3, 1))] == ["m2"]
+
+
+def test_startup_prepares_this_and_next_month(db):
+    assert {"messages_202601", "messages_202602", "message_ids"} <= tables(db)
+    assert message_store._known_partitions == {"messages_202601", "messages_202602"}
+
+
+def test_concurrent_writers_can_both_create_a_new_month(db):
+    engine = db.get_bind()
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def create():
+        session = SessionLocal(bind=engine)
+        try:
+            barrier.wait()
+            ensure_partition(session, datetime(2030, 1, 1))
+            session.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    for _ in range(5):
+        threads = [threading.Thread(target=create) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+    assert "messages_203001" in tables(db)
+
+
+def test_ids_stay_unique_across_a_month_rollover(db):
+    # A request that stamped its message just before midnight and wrote it just after
+    for content, timestamp in (
+        ("jan-31", datetime(2026, 1, 31, 23, 59, 59)),
+        ("feb-1", datetime(2026, 2, 1)),
+        ("jan-late", datetime(2026, 1, 31, 23, 59, 59, 900000)),
+    ):
+        add_message(db, content=content, timestamp=timestamp)
+    db.commit()
+
+    history = [(m.content, m.id) for m in message_history(db)]
+    assert history == [("feb-1", 2), ("jan-late", 3), ("jan-31", 1)]
+
+
+def test_compaction_archives_old_partitions_and_keeps_ids_unique(db):
+    old = add_message(db, content="old", timestamp=datetime(2025, 1, 1))
+    db.commit()
+    assert compact_messages(db, datetime(2026, 1, 1)) == ["messages_202501"]
+    assert "archive_messages_202501" in tables(db)
+
+    new = add_message(db, content="new", timestamp=datetime(2026, 5, 1))
+    db.commit()
+    assert new.id > old.id
+    assert [m.content for m in message_history(db)] == ["new"]
+
+
+def test_migration_moves_base_rows_into_partitions(db):
+    partitioned = add_message(db, content="partitioned", timestamp=datetime(2026, 3, 1))
+    db.commit()
+    # Rows written to the base table before partitioning, one sharing an id
+    db.execute(text(
+        "INSERT INTO messages (id, content, is_broadcast, timestamp) VALUES "
+        f"({partitioned.id}, 'legacy march', 0, '2026-03-02 00:00:00'), "
+        "(100, 'legacy january', 0, '2026-01-02 00:00:00')"
+    ))
+    db.commit()
+
+    assert migrate_messages(db) == 2
+    assert db.execute(text("SELECT COUNT(*) FROM messages")).scalar() == 0
+    history = message_history(db)
+    assert [m.content for m in history] == ["legacy march", "partitioned", "legacy january"]
+    ids = {m.id for m in history}
+    assert len(ids) == 3
+
+    newest = add_message(db, content="after", timestamp=datetime(2026, 3, 3))
+    assert newest.id > max(ids)
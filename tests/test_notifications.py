@@ -0,0 +1,100 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from database import SessionLocal
+from models import Notification
+from notifications import notifications
+
+ORDER = {
+    "id": 0, "name": "n", "phone_no": "1", "email_address": "a@example.com",
+    "quantity": 1, "product_name": "box"
+}
+
+
+def admin_notifications(admin_id):
+    db = SessionLocal()
+    try:
+        return db.query(Notification).filter(Notification.admin_id == admin_id).count()
+    finally:
+        db.close()
+
+
+def test_notifications_are_written_with_the_callers_transaction(client, admin):
+    admin_id, _ = admin
+    before = notifications.unread.get(("admin", admin_id), 0)
+
+    db = SessionLocal()
+    try:
+        assert ("admin", admin_id) in notifications.notify_admins(db, "rolled back")
+        db.rollback()
+        assert admin_notifications(admin_id) == 0
+        assert notifications.unread.get(("admin", admin_id), 0) == before
+
+        notifications.notify_admins(db, "kept")
+        assert notifications.unread.get(("admin", admin_id), 0) == before
+        db.commit()
+    finally:
+        db.close()
+
+    assert admin_notifications(admin_id) == 1
+    assert notifications.unread[("admin", admin_id)] == before + 1
+
+
+def test_new_order_notifies_admins_in_one_commit(client, admin, user):
+    admin_id, admin_headers = admin
+    response = client.post("/orders/create", json=ORDER, headers=user[1])
+    assert response.status_code == 200
+
+    order_id = response.json()["id"]
+    assert admin_notifications(admin_id) == 1
+    unread = client.get("/notifications/admin/unread-count", headers=admin_headers).json()
+    assert unread == {"unread": 1}
+    inbox = client.get("/notifications/admin/", headers=admin_headers).json()
+    assert inbox[0]["content"].startswith(f"New order #{order_id}")
+
+
+def test_status_change_notifies_the_customer(client, admin, user):
+    order_id = client.post("/orders/create", json=ORDER, headers=user[1]).json()["id"]
+    response = client.patch(
+        "/orders/status", json={"order_ids": [order_id], "status": "Confirmed"}, headers=admin[1]
+    )
+    assert response.json()["updated"] == [order_id]
+    assert client.get("/notifications/unread-count", headers=user[1]).json() == {"unread": 1}
+
+
+def test_mark_read_is_committed_by_the_caller(client, admin):
+    admin_id, headers = admin
+    recipient = ("admin", admin_id)
+    db = SessionLocal()
+    try:
+        notifications.notify_admins(db, "note")
+        db.commit()
+        unread = notifications.unread[recipient]
+
+        assert notifications.mark_read(db, recipient) == 1
+        db.rollback()
+        assert notifications.unread[recipient] == unread
+    finally:
+        db.close()
+
+    body = client.post("/notifications/admin/mark-read", json={}, headers=headers).json()
+    assert body == {"marked_read": 1, "unread": unread - 1}
+
+
+def test_unread_counts_reach_only_the_token_holder(client, admin):
+    admin_id, headers = admin
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/ws?client_id=admin:{admin_id}") as ws:
+            ws.receive_json()
+
+    token = headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/ws?token={token}") as ws:
+        assert ws.receive_json()["client_id"] == f"admin:{admin_id}"
+        db = SessionLocal()
+        try:
+            notified = notifications.notify_admins(db, "note")
+            db.commit()
+        finally:
+            db.close()
+        client.portal.call(notifications.push_unread, [r for r in notified if r == ("admin", admin_id)])
+        assert ws.receive_json() == {"type": "unread_count", "count": notifications.unread[("admin", admin_id)]}
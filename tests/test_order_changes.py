@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime
+
+import order_router
+from change_feed import change_event
+from database import SessionLocal
+from models import Order
+
+
+def add_order(**fields):
+    db = SessionLocal()
+    try:
+        order = Order(
+            name="n", phone_no="1", email_address="a@example.com", quantity=1,
+            product_name="box", order_status="Pending", **fields
+        )
+        db.add(order)
+        db.commit()
+        return order.id
+    finally:
+        db.close()
+
+
+def test_change_feed_requires_staff(client, user):
+    assert client.get("/orders/changes?wait=0").status_code == 401
+    assert client.get("/orders/changes?wait=0", headers=user[1]).status_code == 401
+
+
+def test_long_poll_returns_changes_after_the_cursor(client, admin):
+    first = add_order()
+    page = client.get("/orders/changes?wait=0&limit=1000", headers=admin[1]).json()
+    assert first in [change["order"]["id"] for change in page["changes"]]
+
+    second = add_order()
+    page = client.get(f"/orders/changes?wait=0&since={page['cursor']}", headers=admin[1]).json()
+    assert [change["order"]["id"] for change in page["changes"]] == [second]
+
+
+def test_stream_sends_live_writes_stamped_out_of_order(monkeypatch):
+    monkeypatch.setattr(order_router, "_read_changes", lambda cursor, limit: [])
+
+    def event(order_id, minute):
+        order = Order(id=order_id, updated_at=datetime(2026, 1, 1, 12, minute))
+        return change_event(order)
+
+    async def run():
+        queue = asyncio.Queue()
+        for item in (event(1, 5), event(2, 4), event(3, 0), None):
+            queue.put_nowait(item)
+        cursor = "2026-01-01T12:01:00_9"
+        return [chunk async for chunk in order_router._stream_order_changes(queue, cursor, 100)]
+
+    sent = asyncio.run(run())
+    # Order 2 is older than order 1 but newer than the backlog; order 3 was in the backlog
+    assert [chunk.split("\n")[0] for chunk in sent] == [
+        "id: 2026-01-01T12:05:00_1",
+        "id: 2026-01-01T12:04:00_2",
+    ]
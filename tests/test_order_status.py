@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+from starlette.websockets import WebSocketDisconnect
+
+import order_router
+from database import SessionLocal
+from models import Admin, Order
+from query_budget import track_queries
+from schema import OrderStatusUpdateModel
+from websocket_manager import manager
+
+
+def add_order(user_id=None, status="Pending"):
+    db = SessionLocal()
+    try:
+        order = Order(
+            name="n", phone_no="1", email_address="a@example.com", quantity=1,
+            product_name="box", order_status=status, user_id=user_id
+        )
+        db.add(order)
+        db.commit()
+        return order.id
+    finally:
+        db.close()
+
+
+def patch_status(client, admin, order_ids, status):
+    return client.patch("/orders/status", json={"order_ids": order_ids, "status": status}, headers=admin[1])
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """(client_id, message) for every event sent to one client"""
+    sent = []
+
+    async def record(client_id, message):
+        sent.append((client_id, message))
+        return True
+
+    monkeypatch.setattr(manager, "send_to_client", record)
+    return sent
+
+
+def test_invalid_or_unreachable_status_is_rejected(client, admin):
+    order_id = add_order()
+    assert patch_status(client, admin, [order_id], "Bogus").status_code == 400
+    # Nothing moves back to Pending
+    assert patch_status(client, admin, [order_id], "Pending").status_code == 400
+    assert patch_status(client, admin, [], "Confirmed").status_code == 400
+
+
+def test_disallowed_transitions_and_unknown_ids_are_skipped(client, admin):
+    pending, confirmed = add_order(), add_order(status="Confirmed")
+    body = patch_status(client, admin, [pending, pending, confirmed, 99999], "Delivered").json()
+    assert body == {"status": "Delivered", "updated": [confirmed], "skipped": [pending, 99999]}
+
+
+def test_one_event_per_affected_user(client, admin, user, events):
+    user_id = user[0]
+    mine = [add_order(user_id) for _ in range(3)]
+    anonymous = add_order()
+
+    body = patch_status(client, admin, mine + [anonymous], "Confirmed").json()
+    assert sorted(body["updated"]) == sorted(mine + [anonymous])
+
+    changes = [(client_id, m) for client_id, m in events if m["type"] == "order_status_changed"]
+    assert changes == [
+        (str(user_id), {"type": "order_status_changed", "status": "Confirmed", "order_ids": mine})
+    ]
+
+
+def test_the_batch_is_a_single_update(client, admin):
+    order_ids = [add_order() for _ in range(5)]
+    db = SessionLocal()
+    try:
+        current_admin = db.get(Admin, admin[0])
+        request = OrderStatusUpdateModel(order_ids=order_ids, status="Confirmed")
+        with track_queries() as stats:
+            asyncio.run(order_router.update_order_status(request, BackgroundTasks(), current_admin, db))
+    finally:
+        db.close()
+
+    updates = [sql for sql in stats.statements if sql.startswith("UPDATE orders")]
+    assert updates and sum(stats.statements[sql] for sql in updates) == 1
+
+
+def test_order_events_reach_only_the_token_holder(client, admin, user):
+    user_id, headers = user
+    token = headers["Authorization"].split()[1]
+
+    # An anonymous socket can't claim the user's ID
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/ws?client_id={user_id}") as ws:
+            ws.receive_json()
+
+    with client.websocket_connect(f"/ws?client_id=spoofed&token={token}") as ws:
+        assert ws.receive_json()["client_id"] == str(user_id)
+        order_id = add_order(user_id)
+        patch_status(client, admin, [order_id], "Confirmed")
+        received = [ws.receive_json() for _ in range(2)]
+        assert {"type": "order_status_changed", "status": "Confirmed", "order_ids": [order_id]} in received
@@ -0,0 +1,96 @@
+import time
+from contextlib import ExitStack
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import websocket_router as websocket_router_module
+from presence import PresenceService
+from websocket_manager import manager
+
+DEBOUNCE_MS = 50
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(websocket_router_module, "presence", PresenceService(DEBOUNCE_MS))
+    app = FastAPI()
+    app.include_router(websocket_router_module.websocket_router)
+    return app
+
+
+@pytest.fixture
+def frames(monkeypatch):
+    """Count every frame the manager sends"""
+    sent = []
+    original = manager.send_message
+
+    async def counting_send(websocket, message):
+        sent.append(message)
+        return await original(websocket, message)
+
+    monkeypatch.setattr(manager, "send_message", counting_send)
+    return sent
+
+
+def reconnect_storm(app, frames, n):
+    """Connect n clients at once, drop them all, and return the frames it cost"""
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws?client_id=watcher&subscribe_presence=true") as watcher:
+            watcher.receive_json()  # connection_status
+            watcher.receive_json()  # presence_snapshot
+            frames.clear()
+
+            started = time.perf_counter()
+            with ExitStack() as stack:
+                sockets = [
+                    stack.enter_context(client.websocket_connect(f"/ws?client_id=c{i}"))
+                    for i in range(n)
+                ]
+                for ws in sockets:
+                    ws.receive_json()
+            elapsed = time.perf_counter() - started
+            # Let the last debounced diff go out
+            time.sleep(DEBOUNCE_MS / 1000 * 3)
+            assert websocket_router_module.presence.count() == 1
+
+    return len(frames), elapsed
+
+
+@pytest.mark.parametrize("n", [25, 50, 100])
+def test_reconnect_storm_traffic_is_linear(app, frames, n):
+    sent, elapsed = reconnect_storm(app, frames, n)
+    # n connection_status frames, plus at most one diff per debounce window;
+    # per-connect broadcasts would cost n * (n - 1)
+    max_diffs = elapsed / (DEBOUNCE_MS / 1000) + 2
+    assert sent <= n + max_diffs
+    assert sent < n * (n - 1) / 4
+
+
+def test_subscribers_get_coalesced_diffs(app):
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws?client_id=watcher&subscribe_presence=true") as watcher:
+            watcher.receive_json()
+            assert watcher.receive_json() == {"type": "presence_snapshot", "online_count": 1}
+
+            with client.websocket_connect("/ws?client_id=a&name=Ann") as a, \
+                    client.websocket_connect("/ws?client_id=b&name=Bob") as b:
+                a.receive_json()
+                b.receive_json()
+                diff = watcher.receive_json()
+                joined = {entry["client_id"] for entry in diff["joined"]}
+                # The watcher's own join may land in the same window
+                assert {"a", "b"} <= joined
+                assert diff["left"] == []
+
+            diff = watcher.receive_json()
+            assert sorted(diff["left"]) == ["a", "b"]
+            assert diff["online_count"] == 1
+
+
+def test_presence_pages_and_counts():
+    presence = PresenceService()
+    presence.online = {f"c{i}": f"name{i}" for i in range(10)}
+    assert presence.count() == 10
+    assert [entry["client_id"] for entry in presence.list_online(4, 3)] == ["c4", "c5", "c6"]
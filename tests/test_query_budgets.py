@@ -0,0 +1,117 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+import config
+import order_router
+from database import SessionLocal
+from message_store import ensure_partition
+from notifications import notifications
+from query_budget import QueryBudgetExceeded, report, track_queries
+
+ORDER = {
+    "id": 0, "name": "n", "phone_no": "1", "email_address": "a@example.com",
+    "quantity": 1, "product_name": "box"
+}
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    # The mode is read per request, so no reload is needed
+    monkeypatch.setattr(config, "QUERY_BUDGET_MODE", "strict")
+    report.endpoints.clear()
+
+
+def within_budget(name):
+    entry = report.endpoints[name]
+    assert entry["over_budget"] == 0, entry
+    return entry["max_queries"]
+
+
+def test_every_budgeted_endpoint_stays_within_budget(client, admin, user, strict, monkeypatch):
+    # Start cold so the lazy unread-count warmup runs inside a request
+    monkeypatch.setattr(notifications, "_warmed", False)
+    user_headers, admin_headers = user[1], admin[1]
+
+    calls = [
+        ("post", "/orders/create", user_headers, ORDER),
+        ("get", "/orders/", None, None),
+        ("get", "/orders/status/Pending", user_headers, None),
+        ("get", "/auth/users", None, None),
+        ("get", "/notifications/", user_headers, None),
+        ("get", "/notifications/unread-count", user_headers, None),
+        ("post", "/notifications/mark-read", user_headers, {}),
+        ("get", "/notifications/admin", admin_headers, None),
+        ("get", "/notifications/admin/unread-count", admin_headers, None),
+        ("post", "/notifications/admin/mark-read", admin_headers, {}),
+    ]
+    order_id = None
+    for method, path, headers, body in calls:
+        response = client.request(method, path, headers=headers, json=body)
+        assert response.status_code == 200, (path, response.text)
+        if path == "/orders/create":
+            order_id = response.json()["id"]
+
+    assert client.get(f"/orders/{order_id}", headers=user_headers).status_code == 200
+    response = client.patch(
+        "/orders/status", json={"order_ids": [order_id], "status": "Confirmed"}, headers=admin_headers
+    )
+    assert response.json()["updated"] == [order_id]
+
+    for name in (
+        "POST /orders/create",
+        "GET /orders/",
+        "GET /orders/status/{status}",
+        "GET /orders/{order_id}",
+        "PATCH /orders/status",
+        "GET /auth/users",
+        "GET /notifications/",
+        "GET /notifications/unread-count",
+        "POST /notifications/mark-read",
+        "GET /notifications/admin",
+        "GET /notifications/admin/unread-count",
+        "POST /notifications/admin/mark-read",
+    ):
+        within_budget(name)
+
+
+def test_strict_mode_fails_a_request_over_budget(client, strict, monkeypatch):
+    monkeypatch.setattr(order_router.get_orders, "query_budget", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/orders/")
+
+
+def test_off_mode_tracks_nothing(client, monkeypatch):
+    monkeypatch.setattr(config, "QUERY_BUDGET_MODE", "off")
+    monkeypatch.setattr(order_router.get_orders, "query_budget", 0)
+    report.endpoints.clear()
+    assert client.get("/orders/").status_code == 200
+    assert not report.endpoints
+
+
+def test_infrastructure_sql_is_not_counted(client):
+    db = SessionLocal()
+    try:
+        with track_queries() as stats:
+            notifications.warm(db)
+            ensure_partition(db, datetime(2031, 1, 1))
+        db.rollback()
+    finally:
+        db.close()
+    assert stats.count == 0
+
+
+def test_failed_statements_leave_nothing_on_the_connection(client):
+    db = SessionLocal()
+    try:
+        with track_queries() as stats:
+            for _ in range(3):
+                with pytest.raises(Exception):
+                    db.execute(text("SELECT * FROM no_such_table"))
+                db.rollback()
+            db.execute(text("SELECT 1"))
+        assert "query_start" not in db.connection().info
+    finally:
+        db.close()
+    assert stats.count == 1
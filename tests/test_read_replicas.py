@@ -0,0 +1,83 @@
+import itertools
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from starlette.responses import Response
+
+import database
+
+
+def make_request(cookie=None):
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({"type": "http", "headers": headers, "client": ("127.0.0.1", 1234)})
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    monkeypatch.setattr(database, "replica_engines", [engine])
+    monkeypatch.setattr(database, "ReplicaSessions", [sessionmaker(bind=engine)])
+    monkeypatch.setattr(database, "_replica_cycle", itertools.cycle([0]))
+    monkeypatch.setattr(database, "_replica_health", {})
+    return engine
+
+
+def read_bind(request):
+    gen = database.get_read_db(request)
+    db = next(gen)
+    try:
+        return db.get_bind()
+    finally:
+        gen.close()
+
+
+def test_reads_go_to_the_replica(replica):
+    assert read_bind(make_request()) is replica
+
+
+def test_reads_stick_to_the_primary_after_a_write(replica):
+    response = Response()
+    gen = database.get_db(response)
+    db = next(gen)
+    db.execute(text("SELECT 1"))
+    db.commit()
+    gen.close()
+
+    cookie = response.headers["set-cookie"].split(";")[0]
+    assert cookie.startswith(f"{database.STICKY_COOKIE}=")
+    assert read_bind(make_request(cookie)) is database.engine
+    # Other callers are unaffected
+    assert read_bind(make_request()) is replica
+
+
+def test_expired_or_forged_stickiness_is_ignored(replica):
+    now = time.time()
+    for until in (now - 1, now + 3600, "junk"):
+        assert read_bind(make_request(f"{database.STICKY_COOKIE}={until}")) is replica
+
+
+def test_unhealthy_replica_fails_over_to_the_primary(replica, monkeypatch):
+    def broken(index):
+        raise RuntimeError("replica down")
+
+    monkeypatch.setattr(database, "_replica_lag", broken)
+    assert read_bind(make_request()) is database.engine
+
+
+def test_lagging_replica_fails_over_to_the_primary(replica, monkeypatch):
+    monkeypatch.setattr(database, "_replica_lag", lambda index: database.REPLICA_MAX_LAG_SECONDS + 1)
+    assert read_bind(make_request()) is database.engine
+
+
+def test_write_endpoints_set_the_sticky_cookie(client, user):
+    order = {
+        "id": 0, "name": "n", "phone_no": "1", "email_address": "a@example.com",
+        "quantity": 1, "product_name": "box"
+    }
+    response = client.post("/orders/create", json=order, headers=user[1])
+    assert database.STICKY_COOKIE in response.cookies
+    # Reads are not writes
+    assert database.STICKY_COOKIE not in client.get("/orders/").cookies
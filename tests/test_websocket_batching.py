@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+from fakes import FakeWebSocket
+from websocket_manager import WebSocketManager
+
+
+def test_unbatched_sends_one_frame_per_event():
+    async def scenario():
+        manager = WebSocketManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "a")
+        for i in range(5):
+            await manager.send_to_client("a", {"n": i})
+        return ws.frames
+
+    frames = asyncio.run(scenario())
+    assert [json.loads(frame) for frame in frames] == [{"n": i} for i in range(5)]
+
+
+def test_batched_events_arrive_as_one_array_frame():
+    async def scenario():
+        manager = WebSocketManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "a", batch_ms=10)
+        for i in range(5):
+            await manager.send_to_client("a", {"n": i})
+        assert ws.frames == []
+        await asyncio.sleep(0.05)
+        return ws.frames
+
+    frames = asyncio.run(scenario())
+    assert len(frames) == 1
+    assert json.loads(frames[0]) == [{"n": i} for i in range(5)]
+
+
+def test_batch_window_is_capped():
+    async def scenario():
+        manager = WebSocketManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "a", batch_ms=10_000)
+        return manager.sockets[ws].batch_window
+
+    from config import WS_BATCH_MAX_MS
+    assert asyncio.run(scenario()) == WS_BATCH_MAX_MS / 1000
+
+
+def test_full_batch_is_sent_early():
+    from config import WS_BATCH_MAX_EVENTS
+
+    async def scenario():
+        manager = WebSocketManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "a", batch_ms=50)
+        for i in range(WS_BATCH_MAX_EVENTS + 1):
+            await manager.send_to_client("a", {"n": i})
+        early = list(ws.frames)
+        await asyncio.sleep(0.1)
+        return early, ws.frames
+
+    early, frames = asyncio.run(scenario())
+    assert len(early) == 1 and len(json.loads(early[0])) == WS_BATCH_MAX_EVENTS
+    assert json.loads(frames[1]) == [{"n": WS_BATCH_MAX_EVENTS}]
+
+
+def test_batch_is_sent_early_at_the_byte_cap():
+    from config import WS_BATCH_MAX_BYTES
+
+    async def scenario():
+        manager = WebSocketManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "a", batch_ms=50)
+        big = "x" * (WS_BATCH_MAX_BYTES // 2)
+        for _ in range(2):
+            await manager.send_to_client("a", {"data": big})
+        return ws.frames
+
+    frames = asyncio.run(scenario())
+    assert len(frames) == 1
+    assert len(frames[0]) <= WS_BATCH_MAX_BYTES + 100
+
+
+def test_batched_sockets_only_get_arrays():
+    async def scenario():
+        manager = WebSocketManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws, "a", batch_ms=10)
+        await manager.send_to_client("a", {"type": "ping"})
+        await asyncio.sleep(0.05)
+        await manager.drain(1)
+
+        turned_away = FakeWebSocket()
+        await manager.connect(turned_away, "b", batch_ms=10)
+        return ws.frames + turned_away.frames
+
+    frames = [json.loads(frame) for frame in asyncio.run(scenario())]
+    assert all(isinstance(frame, list) for frame in frames)
+    assert [event["type"] for frame in frames for event in frame] == ["ping", "reconnect", "reconnect"]
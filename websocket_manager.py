@@ -1,32 +1,107 @@
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional, Set
 from fastapi import WebSocket
 import json
 from datetime import datetime, timedelta
 import asyncio
+import random
+from itertools import islice
+
+from config import (
+    WS_BATCH_MAX_MS,
+    WS_BATCH_MAX_EVENTS,
+    WS_BATCH_MAX_BYTES,
+    RECONNECT_BASE_MS,
+    RECONNECT_JITTER_MS,
+)
+
+def account_client_id(kind: str, account_id: int) -> str:
+    """Client ID reserved for a token-authenticated account: the user ID, or admin:<id>"""
+    return str(account_id) if kind == "user" else f"admin:{account_id}"
+
+
+def is_account_client_id(client_id: str) -> bool:
+    """Whether a client ID is reserved for an account, so only its token may claim it"""
+    return client_id.isdigit() or client_id.startswith("admin:")
+
+
+class Connection:
+    """Per-socket state; __slots__ keeps each record small at high connection counts"""
+    __slots__ = (
+        "websocket", "client_id", "name", "roles", "last_ping",
+        "batch_window", "batch", "batch_bytes", "flush_task", "sent", "received"
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: Optional[str] = None,
+        name: Optional[str] = None,
+        roles: FrozenSet[str] = frozenset(),
+        batch_window: float = 0.0
+    ):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.name = name
+        self.roles = roles
+        self.last_ping = datetime.now()
+        # Micro-batching state for clients that opted in with batch_ms
+        self.batch_window = batch_window
+        # Queued events, already serialized so the byte cap can be checked
+        self.batch: Optional[List[str]] = None
+        self.batch_bytes = 0
+        self.flush_task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.received = 0
 
 class WebSocketManager:
     def __init__(self):
-        # Store active connections by client ID or username
-        self.connections: Dict[str, WebSocket] = {}
-        self.anonymous_clients: List[WebSocket] = []
-        self.last_ping: Dict[WebSocket, datetime] = {}
+        # Every live connection, keyed by socket; identified ones also by client ID
+        self.sockets: Dict[WebSocket, Connection] = {}
+        self.connections: Dict[str, Connection] = {}
+        # Connections authenticated as staff admins
+        self.admins: Set[Connection] = set()
+        self._ping_task: Optional[asyncio.Task] = None
+        # Set while shutting down so new sockets are turned away
+        self.draining = False
 
-    async def connect(self, websocket: WebSocket, client_id: Optional[str] = None):
-        """Connect a new websocket client"""
+    async def connect(
+        self,
+        websocket: WebSocket,
+        client_id: Optional[str] = None,
+        batch_ms: Optional[int] = None,
+        name: Optional[str] = None,
+        roles: FrozenSet[str] = frozenset()
+    ):
+        """Connect a new websocket client; returns False if turned away while draining"""
         await websocket.accept()
-        self.last_ping[websocket] = datetime.now()
+        if self.draining:
+            # Restarting: point the client at a peer instead of registering it
+            hint = self._reconnect_hint()
+            await websocket.send_text(json.dumps([hint] if batch_ms else hint))
+            await websocket.close(code=1012)
+            return False
+
+        batch_window = min(batch_ms, WS_BATCH_MAX_MS) / 1000 if batch_ms else 0.0
+        conn = Connection(websocket, client_id, name, roles, batch_window)
         
         if client_id:
             # If there's an existing connection with this ID, close it
             if client_id in self.connections:
-                old_ws = self.connections[client_id]
+                old_ws = self.connections[client_id].websocket
                 await self._safe_close(old_ws)
-            self.connections[client_id] = websocket
-        else:
-            self.anonymous_clients.append(websocket)
+            self.connections[client_id] = conn
+        self.sockets[websocket] = conn
+        if "admin" in roles:
+            self.admins.add(conn)
         
-        # Start ping task if not already running
-        if not hasattr(self, '_ping_task'):
+        # Normally started by the app lifespan; covers apps run without it
+        self.start()
+        return True
+
+    def start(self):
+        """Accept sockets again and start the ping task if not already running"""
+        self.draining = False
+        if self._ping_task is None:
             self._ping_task = asyncio.create_task(self._ping_clients())
     
     async def _safe_close(self, websocket: WebSocket):
@@ -40,17 +115,16 @@ class WebSocketManager:
 
     def _cleanup_ws(self, websocket: WebSocket):
         """Remove websocket from all connection tracking"""
-        if websocket in self.last_ping:
-            del self.last_ping[websocket]
+        conn = self.sockets.pop(websocket, None)
+        if conn is None:
+            return
+        self._drop_batch(conn)
+        self.admins.discard(conn)
         
-        # Remove from client connections
-        for client_id, ws in list(self.connections.items()):
-            if ws == websocket:
-                del self.connections[client_id]
-        
-        # Remove from anonymous clients
-        if websocket in self.anonymous_clients:
-            self.anonymous_clients.remove(websocket)
+        # Only drop the ID entry if it still belongs to this socket; a
+        # reconnect with the same ID may already have replaced it
+        if conn.client_id and self.connections.get(conn.client_id) is conn:
+            del self.connections[conn.client_id]
 
     async def _ping_clients(self):
         """Regularly ping connected clients to keep connections alive"""
@@ -60,14 +134,16 @@ class WebSocketManager:
                 to_remove = []
                 
                 # Check all connections
-                for ws in list(self.last_ping.keys()):
+                for conn in list(self.sockets.values()):
                     # Send ping to active connections
                     try:
-                        if now - self.last_ping[ws] > timedelta(seconds=30):
-                            await ws.send_text(json.dumps({"type": "ping"}))
-                            self.last_ping[ws] = now
+                        if now - conn.last_ping > timedelta(seconds=30):
+                            # Through send_message so batched sockets get it in an array
+                            if not await self.send_message(conn.websocket, {"type": "ping"}):
+                                to_remove.append(conn.websocket)
+                            conn.last_ping = now
                     except Exception:
-                        to_remove.append(ws)
+                        to_remove.append(conn.websocket)
                 
                 # Clean up dead connections
                 for ws in to_remove:
@@ -79,62 +155,164 @@ class WebSocketManager:
                 print(f"Ping task error: {e}")
                 await asyncio.sleep(10)
     
+    def _drop_batch(self, conn: Connection):
+        """Discard any pending batch and flush task for a connection"""
+        conn.batch = None
+        conn.batch_bytes = 0
+        task = conn.flush_task
+        conn.flush_task = None
+        if task and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _flush_batch(self, conn: Connection):
+        """Wait out the batching window, then send queued events as one array frame"""
+        await asyncio.sleep(conn.batch_window)
+        conn.flush_task = None
+        await self._send_batch(conn)
+
+    async def _send_batch(self, conn: Connection) -> bool:
+        batch, conn.batch = conn.batch, None
+        conn.batch_bytes = 0
+        if not batch:
+            return True
+        # permessage-deflate is negotiated by the ASGI server (uvicorn enables
+        # it by default), so one larger frame compresses far better than many
+        try:
+            await conn.websocket.send_text("[" + ",".join(batch) + "]")
+            conn.sent += 1
+            return True
+        except Exception:
+            self._cleanup_ws(conn.websocket)
+            return False
+
     def disconnect(self, websocket: WebSocket, client_id: Optional[str] = None):
         """Disconnect a websocket client"""
-        if client_id and client_id in self.connections:
-            del self.connections[client_id]
-        elif websocket in self.anonymous_clients:
-            self.anonymous_clients.remove(websocket)
+        self._cleanup_ws(websocket)
+
+    def record_received(self, websocket: WebSocket):
+        """Count an inbound frame; any traffic from the client proves it is alive"""
+        conn = self.sockets.get(websocket)
+        if conn:
+            conn.received += 1
+            conn.last_ping = datetime.now()
     
     async def send_message(self, websocket: WebSocket, message: dict):
         """Send a message to a specific websocket"""
+        conn = self.sockets.get(websocket)
+        if conn and conn.batch_window:
+            # Queue the event; the first one in a window schedules the flush
+            payload = json.dumps(message)
+            if conn.batch is None:
+                conn.batch = []
+            conn.batch.append(payload)
+            conn.batch_bytes += len(payload) + 1
+            if len(conn.batch) >= WS_BATCH_MAX_EVENTS or conn.batch_bytes >= WS_BATCH_MAX_BYTES:
+                # Full: send it now instead of growing one frame without bound
+                task, conn.flush_task = conn.flush_task, None
+                if task:
+                    task.cancel()
+                return await self._send_batch(conn)
+            if conn.flush_task is None:
+                conn.flush_task = asyncio.create_task(self._flush_batch(conn))
+            return True
+
         try:
             await websocket.send_text(json.dumps(message))
+            if conn:
+                conn.sent += 1
             return True
         except Exception:
             return False
     
     async def send_to_client(self, client_id: str, message: dict):
         """Send a message to a specific client by ID"""
-        if client_id in self.connections:
-            return await self.send_message(self.connections[client_id], message)
+        conn = self.connections.get(client_id)
+        if conn:
+            return await self.send_message(conn.websocket, message)
         return False
     
     async def broadcast(self, message: dict, exclude_client_id: Optional[str] = None):
         """Send a message to all connected clients, optionally excluding one client"""
-        disconnected_clients = []
+        disconnected = []
         
-        # Send to identified clients
-        for client_id, websocket in self.connections.items():
-            if client_id != exclude_client_id:
-                success = await self.send_message(websocket, message)
-                if not success:
-                    disconnected_clients.append(client_id)
+        for conn in list(self.sockets.values()):
+            if conn.client_id is not None and conn.client_id == exclude_client_id:
+                continue
+            success = await self.send_message(conn.websocket, message)
+            if not success:
+                disconnected.append(conn.websocket)
         
         # Clean up disconnected clients
-        for client_id in disconnected_clients:
-            if client_id in self.connections:
-                del self.connections[client_id]
-        
-        # Send to anonymous clients
-        still_connected = []
-        for websocket in self.anonymous_clients:
-            success = await self.send_message(websocket, message)
-            if success:
-                still_connected.append(websocket)
-        
-        self.anonymous_clients = still_connected
+        for websocket in disconnected:
+            self._cleanup_ws(websocket)
         
         # Return total number of recipients
-        return len(self.connections) + len(self.anonymous_clients)
+        return len(self.sockets)
+    
+    async def broadcast_to_admins(self, message: dict):
+        """Send a message to every connection authenticated as a staff admin"""
+        sent = 0
+        for conn in list(self.admins):
+            if await self.send_message(conn.websocket, message):
+                sent += 1
+        return sent
     
-    async def get_connected_clients(self):
-        """Get list of connected client IDs"""
+    async def get_connected_clients(self, offset: int = 0, limit: int = 100):
+        """Get a page of connected client IDs"""
         return {
-            "connected_clients": list(self.connections.keys()),
-            "anonymous_clients_count": len(self.anonymous_clients),
-            "total_clients": len(self.connections) + len(self.anonymous_clients)
+            "connected_clients": list(islice(self.connections, offset, offset + limit)),
+            "anonymous_clients_count": len(self.sockets) - len(self.connections),
+            "total_clients": len(self.sockets)
         }
 
+    def _reconnect_hint(self) -> dict:
+        # Jitter spreads reconnects out so the surviving instances aren't stampeded
+        return {
+            "type": "reconnect",
+            "retry_after_ms": RECONNECT_BASE_MS + random.randint(0, RECONNECT_JITTER_MS)
+        }
+
+    async def _drain_connection(self, conn: Connection):
+        """Flush a socket's pending batch plus a reconnect hint, then close it"""
+        batch, conn.batch = conn.batch or [], None
+        conn.batch_bytes = 0
+        task, conn.flush_task = conn.flush_task, None
+        if task:
+            task.cancel()
+        hint = self._reconnect_hint()
+        try:
+            if conn.batch_window:
+                await conn.websocket.send_text("[" + ",".join(batch + [json.dumps(hint)]) + "]")
+            else:
+                await conn.websocket.send_text(json.dumps(hint))
+            # 1012: service restart
+            await conn.websocket.close(code=1012)
+        except Exception:
+            pass
+
+    async def drain(self, deadline: float) -> int:
+        """
+        Stop accepting sockets, flush outbound batches and send every client a
+        reconnect hint, giving up on stragglers after `deadline` seconds.
+        Returns the number of sockets drained.
+        """
+        self.draining = True
+        if self._ping_task:
+            self._ping_task.cancel()
+            self._ping_task = None
+
+        conns = list(self.sockets.values())
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._drain_connection(conn) for conn in conns)),
+                timeout=deadline
+            )
+        except asyncio.TimeoutError:
+            print(f"WebSocket drain hit the {deadline}s deadline")
+
+        for conn in conns:
+            self._cleanup_ws(conn.websocket)
+        return len(conns)
+
 # Create a global instance
 manager = WebSocketManager()
\ No newline at end of file
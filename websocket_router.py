@@ -1,28 +1,81 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import FrozenSet, Optional, Tuple
 import json
 
-from websocket_manager import manager
+from auth_router import verify_token
+from database import SessionLocal
+from models import Admin, User
+from websocket_manager import account_client_id, is_account_client_id, manager
+from presence import presence
 
 # Create the router
 websocket_router = APIRouter(tags=["websockets"])
 
+def _identity_for_token(token: str) -> Tuple[Optional[str], FrozenSet[str]]:
+    """
+    Client ID and roles an access token proves: admin:<id> for admins (with
+    the "admin" role for staff) or the user ID for users; None if invalid.
+    """
+    try:
+        payload = verify_token(token)
+    except HTTPException:
+        return None, frozenset()
+
+    email = payload.get("sub")
+    db = SessionLocal()
+    try:
+        admin = db.query(Admin).filter(Admin.email == email).first()
+        user = None if admin else db.query(User).filter(User.email == email).first()
+    finally:
+        db.close()
+    if admin:
+        return account_client_id("admin", admin.id), frozenset({"admin"}) if admin.is_staff else frozenset()
+    if user:
+        return account_client_id("user", user.id), frozenset()
+    return None, frozenset()
+
+
 @websocket_router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket, 
     client_id: Optional[str] = Query(None),
-    name: Optional[str] = Query(None)
+    name: Optional[str] = Query(None),
+    batch_ms: Optional[int] = Query(None, ge=0),
+    subscribe_presence: bool = Query(False),
+    token: Optional[str] = Query(None)
 ):
     """
     WebSocket endpoint for real-time chat
-    - client_id: Optional identifier for the client
+    - client_id: Optional identifier for an anonymous client; numeric and
+      admin:<id> IDs are reserved for accounts and are rejected here
     - name: Optional display name for the client
+    - batch_ms: Optional batching window; events sent within it arrive
+      together as a single JSON array frame (capped at WS_BATCH_MAX_MS, and
+      sent early at WS_BATCH_MAX_EVENTS events or WS_BATCH_MAX_BYTES bytes).
+      Every frame on a batched socket is an array, including pings,
+      connection_status and reconnect hints; other sockets get bare objects
+    - subscribe_presence: Receive debounced presence diffs for other clients
+    - token: Optional access token. The client ID then comes from the token
+      (the user ID, or admin:<id>), so order and notification events reach
+      only their owner; staff admins also receive admin broadcasts
     """
-    # Connect the client
-    await manager.connect(websocket, client_id)
-    
     # Use provided name or default
     client_name = name or "Anonymous"
+    roles = frozenset()
+    if token:
+        client_id, roles = await run_in_threadpool(_identity_for_token, token)
+        if client_id is None:
+            await websocket.close(code=1008)
+            return
+    elif client_id and is_account_client_id(client_id):
+        # Only the account's own token may claim its ID
+        await websocket.close(code=1008)
+        return
+
+    # Connect the client
+    if not await manager.connect(websocket, client_id, batch_ms, client_name, roles):
+        return
     
     try:
         # Notify client of successful connection
@@ -36,21 +89,18 @@ async def websocket_endpoint(
             }
         )
         
-        # Notify others that someone joined (if client has an ID)
+        # Record presence (if client has an ID); subscribers get a coalesced diff
         if client_id:
-            await manager.broadcast(
-                {
-                    "type": "client_joined", 
-                    "client_id": client_id,
-                    "client_name": client_name
-                },
-                exclude_client_id=client_id  # Don't send to the client that just joined
-            )
+            presence.join(client_id, client_name)
+
+        if subscribe_presence:
+            await presence.subscribe(websocket)
         
         # Message handling loop
         while True:
             # Wait for messages from this client
             data = await websocket.receive_text()
+            manager.record_received(websocket)
             
             try:
                 message = json.loads(data)
@@ -58,6 +108,14 @@ async def websocket_endpoint(
                 # Handle ping/pong to keep connection alive
                 if message.get("type") == "pong":
                     continue
+
+                if message.get("type") == "presence_subscribe":
+                    await presence.subscribe(websocket)
+                    continue
+
+                if message.get("type") == "presence_unsubscribe":
+                    presence.unsubscribe(websocket)
+                    continue
                 
                 # Extract message content
                 content = message.get("content")
@@ -90,15 +148,31 @@ async def websocket_endpoint(
     except WebSocketDisconnect:
         # Handle disconnection
         manager.disconnect(websocket, client_id)
-        
-        # Notify others that client disconnected (if client had an ID)
-        if client_id:
-            await manager.broadcast({
-                "type": "client_left", 
-                "client_id": client_id,
-                "client_name": client_name
-            })
     
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(websocket, client_id)
\ No newline at end of file
+        manager.disconnect(websocket, client_id)
+
+    finally:
+        presence.unsubscribe(websocket)
+        # Mark offline unless the same client ID has already reconnected
+        if client_id and client_id not in manager.connections:
+            presence.leave(client_id)
+
+
+@websocket_router.get("/presence")
+async def get_presence(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Get a page of online clients"""
+    return {
+        "online_count": presence.count(),
+        "clients": presence.list_online(offset, limit)
+    }
+
+
+@websocket_router.get("/presence/count")
+async def get_presence_count():
+    """Get the number of online clients"""
+    return {"online_count": presence.count()}
\ No newline at end of file